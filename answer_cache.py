@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from threading import Lock
+from dotenv import load_dotenv
+import numpy as np
+import os
+import time
+
+load_dotenv()
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 60 * 60)))
+ANSWER_CACHE_MAX_PER_SUBJECT = int(os.getenv("ANSWER_CACHE_MAX_PER_SUBJECT", "512"))
+
+
+class SemanticAnswerCache:
+    """Answers keyed by (subject, year, semester) and matched by question-embedding similarity
+    among entries of the same answer variant (prompt template and token budgets).
+
+    Each entry records the vectorstore version it was answered against; a lookup against a
+    different version clears that subject, so rebuilding an index invalidates its answers.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl_seconds: int = ANSWER_CACHE_TTL,
+                 max_entries_per_subject: int = ANSWER_CACHE_MAX_PER_SUBJECT):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_subject = max_entries_per_subject
+        self._subjects = {}  # key -> {"version": str, "entries": OrderedDict[int, dict]}
+        self._next_id = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _bucket(self, key, version: str):
+        bucket = self._subjects.get(key)
+        if bucket is None or bucket["version"] != version:
+            if bucket is not None:
+                self.invalidations += 1
+            bucket = {"version": version, "entries": OrderedDict()}
+            self._subjects[key] = bucket
+        return bucket
+
+    def lookup(self, key, version: str, vector, variant):
+        query = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            entries = self._bucket(key, version)["entries"]
+            for entry_id in [i for i, e in entries.items() if now - e["created_at"] > self.ttl_seconds]:
+                del entries[entry_id]
+            ids = [i for i, e in entries.items() if e["variant"] == variant]
+            if not ids:
+                self.misses += 1
+                return None
+
+            similarities = np.stack([entries[i]["vector"] for i in ids]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entries.move_to_end(ids[best])
+            self.hits += 1
+            entry = entries[ids[best]]
+            return {"answer": entry["answer"], "images": entry["images"], "similarity": float(similarities[best])}
+
+    def store(self, key, version: str, vector, variant, question: str, answer: str, images: list):
+        with self._lock:
+            entries = self._bucket(key, version)["entries"]
+            self._next_id += 1
+            entries[self._next_id] = {
+                "vector": self._unit(vector),
+                "variant": variant,
+                "question": question,
+                "answer": answer,
+                "images": images,
+                "created_at": time.time(),
+            }
+            while len(entries) > self.max_entries_per_subject:
+                entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._subjects.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "subjects": len(self._subjects),
+                "entries": sum(len(b["entries"]) for b in self._subjects.values()),
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+answer_cache = SemanticAnswerCache()
@@ -4,11 +4,14 @@ from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 import os
-from passlib.context import CryptContext
 from typing import Optional
 from models.user import User, UserRole
-from database import users_collection
+from database import users_collection, revoked_tokens_collection, pwd_context
+from principal_cache import principal_cache
 from bson import ObjectId
+from pymongo import ASCENDING
+import asyncio
+import hashlib
 
 load_dotenv()
 
@@ -19,9 +22,14 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # 30 minutes for access token
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # 7 days for refresh token
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Everything User needs except the password hash (and never the chats array)
+PRINCIPAL_PROJECTION = {
+    "_id": 0, "username": 1, "email": 1, "role": 1, "mobile": 1, "location": 1,
+    "github": 1, "linkedin": 1, "portfolio": 1, "created_at": 1, "updated_at": 1,
+}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -71,10 +79,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Common case: this token was verified moments ago, no decode or DB read needed.
+    # A logout in another worker is seen here once this worker's entry expires (AUTH_CACHE_TTL).
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+    if principal_cache.is_revoked(token):
+        raise credentials_exception
+
     try:
-        print(f"Verifying token: {token[:10]}...")  # Log first 10 chars of token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"Decoded token payload: {payload}")  # Log entire payload
         
         username: str = payload.get("sub")
         if username is None:
@@ -83,28 +97,31 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         
         # Get role from token
         role = payload.get("role")
-        print(f"Token payload - username: {username}, role: {role}")
         
-        # Get user from database
-        user = await users_collection.find_one({"username": username})
+        # Get user from database, and check logouts recorded by any worker
+        user, revoked = await asyncio.gather(
+            users_collection.find_one({"username": username}, PRINCIPAL_PROJECTION),
+            revoked_tokens_collection.find_one({"_id": _token_key(token)}, {"_id": 1}),
+        )
+        if revoked is not None:
+            principal_cache.revoke(token, payload.get("exp", 0))
+            raise credentials_exception
         if user is None:
             print(f"No user found for username: {username}")
             raise credentials_exception
-            
-        print(f"User from database: {user}")  # Log user data from database
         
         # Convert role to string for comparison
         db_role = str(user.get("role", UserRole.USER))
         token_role = str(role) if role is not None else None
         
-        print(f"Role comparison - Token role: {token_role}, DB role: {db_role}")
-        
         # Verify role matches
         if token_role != db_role:
             print(f"Role mismatch - token: {token_role}, user: {db_role}")
             raise credentials_exception
             
-        return User(**user)
+        principal = User(**user)
+        principal_cache.put(token, principal, payload.get("exp"))
+        return principal
     except JWTError as e:
         print(f"JWT verification failed: {str(e)}")
         raise credentials_exception
@@ -112,6 +129,31 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         print(f"Unexpected error in get_current_user: {str(e)}")
         raise credentials_exception
 
+def invalidate_user(username: str):
+    # Call after changing anything get_current_user returns (profile fields, role)
+    principal_cache.invalidate_user(username)
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def ensure_auth_indexes():
+    await revoked_tokens_collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+async def revoke_token(token: str):
+    try:
+        expires_at = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return
+    if expires_at is None:
+        return
+    principal_cache.revoke(token, expires_at)
+    # Shared with the other workers; the TTL index drops the record when the token would expire anyway
+    await revoked_tokens_collection.update_one(
+        {"_id": _token_key(token)},
+        {"$set": {"expires_at": datetime.utcfromtimestamp(expires_at)}},
+        upsert=True,
+    )
+
 async def get_current_admin(current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -0,0 +1,84 @@
+from langchain_community.vectorstores import FAISS
+from splitter_vectorstore import get_embeddings
+from index_spec import all_vectors, format_index_spec, make_index, parse_index_spec
+import argparse
+import time
+import faiss
+import numpy as np
+
+DEFAULT_SPECS = [
+    "flat",
+    "hnsw:M=32,efSearch=64",
+    "ivf:nlist=256,nprobe=16",
+    "ivfpq:nlist=256,m=16,nbits=8,nprobe=16",
+]
+
+
+def _queries(vectors, query_file, sample, seed):
+    if query_file:
+        with open(query_file, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        return np.asarray(get_embeddings().embed_documents(questions), dtype=np.float32)
+    # Without real questions, perturbed stored chunks stand in for queries
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)]
+    noise = rng.normal(scale=0.05, size=picked.shape).astype(np.float32)
+    return picked + noise
+
+
+def _benchmark(spec, vectors, queries, truth, k):
+    start = time.perf_counter()
+    index = make_index(spec, vectors)
+    build_seconds = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, found = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found[0]) & set(expected))
+
+    return {
+        "spec": format_index_spec(parse_index_spec(spec)),
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "ram_mb": faiss.serialize_index(index).nbytes / (1024 * 1024),
+        "build_s": build_seconds,
+    }
+
+
+def benchmark_store(store_path, specs, k=10, query_file=None, sample=200, seed=0):
+    store = FAISS.load_local(store_path, embeddings=get_embeddings(), allow_dangerous_deserialization=True)
+    vectors = all_vectors(store.index)
+    queries = _queries(vectors, query_file, sample, seed)
+
+    # Exact neighbours from a flat index are the recall baseline
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    print(f"\n📊 {store_path}: {len(vectors)} vectors, {len(queries)} queries, k={k}")
+    print(f"{'index':<42}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}{'RAM MB':>10}{'build s':>10}")
+    results = []
+    for spec in specs:
+        result = _benchmark(spec, vectors, queries, truth, k)
+        results.append(result)
+        print(
+            f"{result['spec']:<42}{result['recall']:>10.3f}{result['p50_ms']:>10.3f}"
+            f"{result['p99_ms']:>10.3f}{result['ram_mb']:>10.2f}{result['build_s']:>10.2f}"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare FAISS index types on persisted vectorstores")
+    parser.add_argument("stores", nargs="+", help="vectorstore directories, e.g. vectorstores/EDC_2_3")
+    parser.add_argument("--specs", nargs="+", default=DEFAULT_SPECS)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", default=None, help="text file with one question per line")
+    parser.add_argument("--sample", type=int, default=200, help="stored chunks used as queries when --queries is not given")
+    args = parser.parse_args()
+
+    for store_path in args.stores:
+        benchmark_store(store_path, args.specs, k=args.k, query_file=args.queries, sample=args.sample)
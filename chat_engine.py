@@ -1,21 +1,31 @@
-from memory_handler import get_memory
-from query_optimizer import optimize_query
-from image_retriever import get_images_by_doc_and_pages
-from langchain_community.vectorstores import FAISS
+from memory_handler import load_history, add_turn, aload_history, aadd_turn, history_to_str, trim_history
+from query_optimizer import optimize_query, aoptimize_query
+from image_retriever import get_images_by_doc_and_pages, aget_images_by_doc_and_pages
+from vectorstore_cache import vectorstore_cache
+from workers import run_cpu
+from rerank_service import RerankService
+from embedding_cache import CachedEmbeddings
+from answer_cache import answer_cache
+from sparse_index import BM25Index, hybrid_search
+from index_spec import apply_index_spec
+from mmap_store import load_search_vectorstore
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from sentence_transformers import CrossEncoder
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from pathlib import Path
+from functools import lru_cache
 from dotenv import load_dotenv
 import os
 import tiktoken
 
 load_dotenv()
 
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Query embeddings are cached by normalized text; FAISS calls embed_query through this wrapper
+embedding_model = CachedEmbeddings(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
+# Pairs from concurrent requests are scored together in one forward pass
+reranker = RerankService(CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2"))
 
 llm = ChatOpenAI(
     model="gpt-4o-mini",
@@ -69,11 +79,25 @@ def count_tokens(text: str) -> int:
 
 ## Loading VectorStores
 
-def load_vectorstore(subject: str, semester: str, year: str):
-    vectorstore_path = Path(f"vectorstores/{subject}_{year}_{semester}").resolve()
+def _vectorstore_path(subject: str, semester: str, year: str) -> Path:
+    return Path(f"vectorstores/{subject}_{year}_{semester}").resolve()
+
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "10"))
+
+def _load_indexes(path: Path):
+    vectorstore = load_search_vectorstore(path, embedding_model, allow_pickle=True)
+    return apply_index_spec(vectorstore, path), BM25Index.load(path)
+
+def load_search_indexes(subject: str, semester: str, year: str):
+    # (dense store, BM25 index or None for stores built before sparse indexes)
+    vectorstore_path = _vectorstore_path(subject, semester, year)
     if not vectorstore_path.exists():
         raise ValueError(f"Vectorstore for {subject} Semester {semester}, Year {year} not found.")
-    return FAISS.load_local(vectorstore_path, embeddings=embedding_model, allow_dangerous_deserialization=True)
+    return vectorstore_cache.get((subject, year, semester), vectorstore_path, _load_indexes)
+
+def _retrieve(subject: str, semester: str, year: str, optimized_query: str):
+    vectorstore, sparse = load_search_indexes(subject, semester, year)
+    return hybrid_search(vectorstore, sparse, optimized_query, k=RETRIEVAL_K)
 
 def get_token_limits(question: str) -> tuple[int, int]:
     # Keywords indicating brief/short responses
@@ -164,54 +188,92 @@ GUIDELINES:
 FINAL ANSWER:
 """
 
-def get_chat_response(username: str, question: str, session_id: str, year: str, semester: str, subject: str):
-    memory = get_memory(username, session_id, year, semester, subject)
-    chat_history = memory.load_memory_variables({}).get("history", [])
-    chat_history_str = "\n".join([f"{msg.type.upper()}: {msg.content}" for msg in chat_history])
-
-    chat_tokens = count_tokens(chat_history_str)
+def _trim_history(chat_history) -> str:
+    # Token counts are stored with each message, so this is arithmetic only
     max_chat_tokens = 400
-    if chat_tokens > max_chat_tokens:
-        trimmed_history = chat_history[-5:]
-        chat_history_str = "\n".join([f"{msg.type.upper()}: {msg.content}" for msg in trimmed_history])
+    return history_to_str(trim_history(chat_history, max_chat_tokens))
 
-    optimized_query = optimize_query(question, chat_history_str)
-    
-    # Get dynamic token limits based on the question
-    max_context_tokens, max_output_tokens = get_token_limits(question)
-    
-    # Update LLM configuration with dynamic token limit
-    llm = ChatOpenAI(
+@lru_cache(maxsize=None)
+def _get_llm(max_output_tokens: int) -> ChatOpenAI:
+    # One client per output budget so the HTTP connection pool is reused across requests
+    return ChatOpenAI(
         model="gpt-4o-mini",
         temperature=0.5,
         max_tokens=max_output_tokens,
         openai_api_key=os.getenv("OPENAI_API_KEY")
     )
-    
-    # Get appropriate prompt template
+
+def _answer_variant(question: str):
+    # (brief prompt?, (context tokens, output tokens)); answers differ between variants
     is_brief = any(keyword in question.lower() for keyword in ['brief', 'short', 'summarize', 'quick', 'concise'])
+    return is_brief, get_token_limits(question)
+
+def _build_answer_chain(question: str):
+    # Dynamic token limits and prompt template based on the question
+    is_brief, (max_context_tokens, max_output_tokens) = _answer_variant(question)
     prompt_template = PromptTemplate.from_template(get_prompt_template(is_brief))
-    answer_chain = prompt_template | llm | StrOutputParser()
-    
-    #Load the vectorstore
-    vectorstore = load_vectorstore(subject, semester, year)
-    
-    #Retrieved Docs
-    initial_docs = vectorstore.similarity_search(optimized_query, k=10)
-    doc_texts = [doc.page_content for doc in initial_docs]
-    scores = reranker.predict([(optimized_query, text) for text in doc_texts])
+    answer_chain = prompt_template | _get_llm(max_output_tokens) | StrOutputParser()
+    return answer_chain, max_context_tokens
+
+def _top_ranked(initial_docs, scores):
     ranked_docs = sorted(zip(initial_docs, scores), key=lambda x: x[1], reverse=True)
-    top_docs = [doc for doc, _ in ranked_docs[:5]]
+    return [doc for doc, _ in ranked_docs[:5]]
 
+def _rerank(optimized_query: str, initial_docs):
+    scores = reranker.predict([(optimized_query, doc.page_content) for doc in initial_docs])
+    return _top_ranked(initial_docs, scores)
+
+async def _arerank(optimized_query: str, initial_docs):
+    scores = await reranker.apredict([(optimized_query, doc.page_content) for doc in initial_docs])
+    return _top_ranked(initial_docs, scores)
+
+def _pack_context(top_docs, max_context_tokens: int) -> str:
     context = ""
     total_tokens = 0
 
     for doc in top_docs:
-        doc_tokens = count_tokens(doc.page_content)
+        # Precomputed at ingestion; stores built before that fall back to counting here
+        doc_tokens = doc.metadata.get("token_count")
+        if doc_tokens is None:
+            doc_tokens = count_tokens(doc.page_content)
         if total_tokens + doc_tokens > max_context_tokens:
             break
         context += doc.page_content + "\n\n"
         total_tokens += doc_tokens
+    return context
+
+def _image_lookup_args(top_docs):
+    doc_filename = os.path.basename(top_docs[0].metadata["source"])
+    page_numbers = [doc.metadata["page"] for doc in top_docs if "page" in doc.metadata]
+    return doc_filename, page_numbers
+
+def _answer_cache_slot(question: str, year: str, semester: str, subject: str):
+    # Only standalone questions (no prior turns in the session) are served from or stored in the
+    # semantic cache, since follow-ups depend on history the cache key does not capture.
+    key = (subject, year, semester)
+    version = vectorstore_cache.version(_vectorstore_path(subject, semester, year))
+    return key, version, embedding_model.embed_query(question), _answer_variant(question)
+
+def get_chat_response(username: str, question: str, session_id: str, year: str, semester: str, subject: str):
+    chat_history = load_history(username, session_id, year, semester, subject)
+
+    cache_slot = None
+    if not chat_history:
+        cache_slot = _answer_cache_slot(question, year, semester, subject)
+        cached = answer_cache.lookup(*cache_slot)
+        if cached:
+            add_turn(username, session_id, year, semester, subject, question, cached["answer"])
+            return {"answer": cached["answer"], "images": cached["images"]}
+
+    chat_history_str = _trim_history(chat_history)
+
+    optimized_query = optimize_query(question, chat_history_str)
+    answer_chain, max_context_tokens = _build_answer_chain(question)
+    
+    #Retrieved Docs (dense + BM25, fused)
+    initial_docs = _retrieve(subject, semester, year, optimized_query)
+    top_docs = _rerank(optimized_query, initial_docs)
+    context = _pack_context(top_docs, max_context_tokens)
 
     response = answer_chain.invoke({
         "chat_history": chat_history_str,
@@ -219,14 +281,98 @@ def get_chat_response(username: str, question: str, session_id: str, year: str,
         "question": optimized_query
     })
 
-    memory.chat_memory.add_user_message(question)
-    memory.chat_memory.add_ai_message(response)
+    add_turn(username, session_id, year, semester, subject, question, response)
 
-    doc_filename = os.path.basename(top_docs[0].metadata["source"])
-    page_numbers = [doc.metadata["page"] for doc in top_docs if "page" in doc.metadata]
-    images = get_images_by_doc_and_pages(doc_filename, page_numbers)
+    images = get_images_by_doc_and_pages(*_image_lookup_args(top_docs))
+
+    if cache_slot:
+        answer_cache.store(*cache_slot, question, response, images)
+
+    return {
+        "answer": response,
+        "images": images
+    }
+
+async def _alookup_cached_answer(chat_history, question: str, year: str, semester: str, subject: str,
+                                 use_answer_cache: bool = True):
+    if chat_history or not use_answer_cache:
+        return None, None
+    cache_slot = await run_cpu(_answer_cache_slot, question, year, semester, subject)
+    return cache_slot, answer_cache.lookup(*cache_slot)
+
+async def _aprepare_answer(chat_history, question: str, year: str, semester: str, subject: str):
+    # Everything up to the answer LLM call. LLM and memory calls are awaited natively and
+    # CPU-bound work (index load, embedding + hybrid search) runs on the bounded cpu pool; reranking
+    # goes through the shared batching service.
+    chat_history_str = _trim_history(chat_history)
+
+    optimized_query = await aoptimize_query(question, chat_history_str)
+    answer_chain, max_context_tokens = _build_answer_chain(question)
+
+    initial_docs = await run_cpu(_retrieve, subject, semester, year, optimized_query)
+    top_docs = await _arerank(optimized_query, initial_docs)
+    context = _pack_context(top_docs, max_context_tokens)
+
+    inputs = {
+        "chat_history": chat_history_str,
+        "context": context,
+        "question": optimized_query
+    }
+    return answer_chain, inputs, top_docs
+
+async def aget_chat_response(username: str, question: str, session_id: str, year: str, semester: str, subject: str,
+                             use_answer_cache: bool = True):
+    # use_answer_cache=False for prompts that carry an uploaded file: the embedding only sees the
+    # leading text, so two different files behind the same question would match each other
+    chat_history = await aload_history(username, session_id, year, semester, subject)
+
+    cache_slot, cached = await _alookup_cached_answer(chat_history, question, year, semester, subject, use_answer_cache)
+    if cached:
+        await aadd_turn(username, session_id, year, semester, subject, question, cached["answer"])
+        return {"answer": cached["answer"], "images": cached["images"]}
+
+    answer_chain, inputs, top_docs = await _aprepare_answer(chat_history, question, year, semester, subject)
+
+    response = await answer_chain.ainvoke(inputs)
+
+    await aadd_turn(username, session_id, year, semester, subject, question, response)
+
+    images = await aget_images_by_doc_and_pages(*_image_lookup_args(top_docs))
+
+    if cache_slot:
+        answer_cache.store(*cache_slot, question, response, images)
 
     return {
         "answer": response,
         "images": images
     }
+
+async def astream_chat_response(username: str, question: str, session_id: str, year: str, semester: str, subject: str):
+    # Yields ("token", text) as the answer is generated, then ("images", [...]) once the
+    # turn has been written to memory. Nothing is persisted if the consumer stops early.
+    chat_history = await aload_history(username, session_id, year, semester, subject)
+
+    cache_slot, cached = await _alookup_cached_answer(chat_history, question, year, semester, subject)
+    if cached:
+        yield "token", cached["answer"]
+        await aadd_turn(username, session_id, year, semester, subject, question, cached["answer"])
+        yield "images", cached["images"]
+        return
+
+    answer_chain, inputs, top_docs = await _aprepare_answer(chat_history, question, year, semester, subject)
+
+    parts = []
+    async for chunk in answer_chain.astream(inputs):
+        if chunk:
+            parts.append(chunk)
+            yield "token", chunk
+    response = "".join(parts)
+
+    await aadd_turn(username, session_id, year, semester, subject, question, response)
+
+    images = await aget_images_by_doc_and_pages(*_image_lookup_args(top_docs))
+
+    if cache_slot:
+        answer_cache.store(*cache_slot, question, response, images)
+
+    yield "images", images
@@ -0,0 +1,136 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, TEXT
+import base64
+import json
+from database import chats_collection
+from query_stats import record_query
+
+# One document per chat turn, instead of an ever-growing "chats" array on the user profile.
+
+async def ensure_chat_indexes():
+    await chats_collection.create_index(
+        [("username", ASCENDING), ("session_id", ASCENDING), ("timestamp", ASCENDING)]
+    )
+    await chats_collection.create_index(
+        [("year", ASCENDING), ("semester", ASCENDING), ("subject", ASCENDING)]
+    )
+    # Per-user full-text search; username is the equality prefix of every $text query
+    await chats_collection.create_index(
+        [("username", ASCENDING), ("question", TEXT), ("answer", TEXT)],
+        weights={"question": 3, "answer": 1},
+        name="chat_search"
+    )
+
+async def log_chat(username: str, entry: dict):
+    doc = dict(entry)
+    doc["username"] = username
+    doc.setdefault("timestamp", datetime.utcnow())
+    await chats_collection.insert_one(doc)
+    await record_query(doc)
+    return doc
+
+def _encode_cursor(score: float, doc_id) -> str:
+    is_oid = isinstance(doc_id, ObjectId)
+    raw = json.dumps({"s": score, "id": str(doc_id), "oid": is_oid})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    doc_id = ObjectId(raw["id"]) if raw["oid"] else raw["id"]
+    return float(raw["s"]), doc_id
+
+async def search_chats(username: str, query: str, subject: str | None = None, semester: str | None = None,
+                       session_id: str | None = None, limit: int = 20, cursor: str | None = None):
+    # Ranked by text score, then _id; `cursor` continues after the last match of the previous page.
+    # Raises ValueError for a malformed cursor.
+    match = {"username": username, "$text": {"$search": query}}
+    for field, value in (("subject", subject), ("semester", semester), ("session_id", session_id)):
+        if value:
+            match[field] = value
+
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        try:
+            last_score, last_id = _decode_cursor(cursor)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        # $expr comparisons follow BSON order across types (migrated turns have string ids)
+        pipeline.append({"$match": {"$expr": {"$or": [
+            {"$lt": ["$score", last_score]},
+            {"$and": [{"$eq": ["$score", last_score]}, {"$lt": ["$_id", last_id]}]},
+        ]}}})
+    pipeline += [
+        {"$sort": {"score": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": {"username": 0}},
+    ]
+
+    docs = await chats_collection.aggregate(pipeline).to_list(length=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_cursor(docs[-1]["score"], docs[-1]["_id"])
+
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return docs, next_cursor
+
+def _encode_list_cursor(doc) -> str:
+    ts = doc.get("timestamp")
+    raw = {
+        "sid": doc.get("session_id"),
+        "ts": ts.isoformat() if isinstance(ts, datetime) else None,
+        "id": str(doc["_id"]),
+        "oid": isinstance(doc["_id"], ObjectId),
+    }
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+
+def _decode_list_cursor(cursor: str):
+    raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    ts = datetime.fromisoformat(raw["ts"]) if raw["ts"] else None
+    doc_id = ObjectId(raw["id"]) if raw["oid"] else raw["id"]
+    return raw["sid"], ts, doc_id
+
+async def list_chats(username: str, subject: str | None = None, semester: str | None = None,
+                     session_id: str | None = None, limit: int = 100, cursor: str | None = None):
+    # A user's turns in (session_id, timestamp, _id) order, walking the
+    # (username, session_id, timestamp) index. Migrated turns have no timestamp
+    # and sort first in their session. Raises ValueError for a malformed cursor.
+    match = {"username": username}
+    for field, value in (("subject", subject), ("semester", semester), ("session_id", session_id)):
+        if value:
+            match[field] = value
+
+    if cursor:
+        try:
+            last_sid, last_ts, last_id = _decode_list_cursor(cursor)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if last_ts is None:
+            later_in_session = [
+                {"session_id": last_sid, "timestamp": {"$ne": None}},
+                {"session_id": last_sid, "timestamp": None, "_id": {"$gt": last_id}},
+            ]
+        else:
+            later_in_session = [
+                {"session_id": last_sid, "timestamp": {"$gt": last_ts}},
+                {"session_id": last_sid, "timestamp": last_ts, "_id": {"$gt": last_id}},
+            ]
+        match["$or"] = [{"session_id": {"$gt": last_sid}}] + later_in_session
+
+    docs = await chats_collection.find(match, {"username": 0}) \
+        .sort([("session_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_list_cursor(docs[-1])
+
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return docs, next_cursor
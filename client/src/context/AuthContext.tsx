@@ -21,7 +21,7 @@ interface AuthContextType {
   isLoading: boolean;
   login: (username: string, password: string) => Promise<void>;
   signup: (username: string, email: string, password: string) => Promise<void>;
-  logout: () => void;
+  logout: () => Promise<void>;
   setUser: (user: User | null) => void;
   refreshAccessToken: () => Promise<void>;
 }
@@ -207,7 +207,20 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
     }
   };
 
-  const logout = () => {
+  const logout = async () => {
+    const accessToken = localStorage.getItem('access_token');
+    if (accessToken) {
+      try {
+        // Revoke the access token server-side; plain axios so an expired token doesn't trigger a refresh
+        await axios.post(`${API_BASE}/logout`, null, {
+          headers: { Authorization: `Bearer ${accessToken}` }
+        });
+      } catch (error) {
+        // Already expired or revoked: clearing local state below still logs the user out
+        console.error('Logout request failed:', error);
+      }
+    }
+
     try {
       localStorage.removeItem('user');
       localStorage.removeItem('access_token');
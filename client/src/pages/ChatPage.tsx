@@ -336,16 +336,23 @@ const ChatPage: React.FC = () => {
 
       try {
         setIsLoadingHistory(true);
-        const response = await api.get('/search_chats', {
-          params: { query: '' }
-        });
+        // An empty query lists every turn; follow next_cursor until the last page
+        const chats: any[] = [];
+        let cursor: string | null = null;
+        do {
+          const response = await api.get<{ matches: any[]; next_cursor: string | null }>('/search_chats', {
+            params: { query: '', limit: 100, ...(cursor ? { cursor } : {}) }
+          });
+
+          if (!response.data) throw new Error('Failed to fetch chat history');
 
-        if (!response.data) throw new Error('Failed to fetch chat history');
+          chats.push(...response.data.matches);
+          cursor = response.data.next_cursor;
+        } while (cursor);
 
-        const data = response.data;
         const sessionMap = new Map<string, ChatSession>();
 
-        data.matches.forEach((chat: any) => {
+        chats.forEach((chat: any) => {
           if (!sessionMap.has(chat.session_id)) {
             sessionMap.set(chat.session_id, {
               id: chat.session_id,
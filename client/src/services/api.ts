@@ -22,6 +22,33 @@ export const startChat = async (
   return response.data;
 };
 
+interface MultimodalJob {
+  job_id: string;
+  status: 'running' | 'done' | 'failed';
+  filename: string;
+  error: string | null;
+}
+
+const JOB_POLL_INTERVAL_MS = 2000;
+const JOB_POLL_TIMEOUT_MS = 15 * 60 * 1000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Large uploads are extracted in the background: the server answers 202 with a job,
+// we poll it until the text is ready and then ask again with the job_id instead of the file.
+const waitForJob = async (jobId: string): Promise<void> => {
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const { data } = await api.get<MultimodalJob>(`/multimodal_jobs/${jobId}`);
+    if (data.status === 'done') return;
+    if (data.status === 'failed') {
+      throw new Error(data.error || 'Could not extract file content');
+    }
+    await sleep(JOB_POLL_INTERVAL_MS);
+  }
+  throw new Error('Timed out while processing the uploaded file');
+};
+
 export const multimodalChat = async (
   question: string,
   sessionId: string,
@@ -30,18 +57,33 @@ export const multimodalChat = async (
   subject: string,
   file: File
 ): Promise<ChatResponse> => {
-  const formData = new FormData();
-  formData.append('question', question);
-  formData.append('session_id', sessionId);
-  formData.append('year', year);
-  formData.append('semester', semester);
-  formData.append('subject', subject);
-  formData.append('file', file);
-
-  const response = await api.post('/multimodal_chat', formData, {
-    headers: {
-      'Content-Type': 'multipart/form-data',
-    },
-  });
+  const buildForm = (jobId?: string) => {
+    const formData = new FormData();
+    formData.append('question', question);
+    formData.append('session_id', sessionId);
+    formData.append('year', year);
+    formData.append('semester', semester);
+    formData.append('subject', subject);
+    if (jobId) {
+      formData.append('job_id', jobId);
+    } else {
+      formData.append('file', file);
+    }
+    return formData;
+  };
+
+  const post = (jobId?: string) =>
+    api.post('/multimodal_chat', buildForm(jobId), {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+
+  let response = await post();
+  while (response.status === 202) {
+    const job = response.data as MultimodalJob;
+    await waitForJob(job.job_id);
+    response = await post(job.job_id);
+  }
   return response.data;
-}; 
\ No newline at end of file
+};
\ No newline at end of file
@@ -1,9 +1,15 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from passlib.context import CryptContext
+from password_hashing import PasswordHasher
 client = AsyncIOMotorClient("mongodb://localhost:27017/")
 db = client["chatbot_db"]
 users_collection = db["userprofile"] 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+chats_collection = db["chat_logs"]
+# Logged-out access tokens (sha256 of the token), removed by a TTL index once they expire
+revoked_tokens_collection = db["revoked_tokens"]
+# argon2 for new hashes; bcrypt hashes (older admin accounts) still verify and get upgraded on login
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(pwd_context)
 
 async def find_user(user):
     db_user = await users_collection.find_one({"username": user.username})
@@ -0,0 +1,181 @@
+from array import array
+from collections import OrderedDict
+from threading import Lock, local
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+import atexit
+import os
+import sqlite3
+import time
+
+load_dotenv()
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # e.g. "cache/query_embeddings.sqlite"
+# Rows kept in the spill file; the oldest writes are evicted first
+EMBEDDING_SPILL_MAX_ROWS = int(os.getenv("EMBEDDING_SPILL_MAX_ROWS", "200000"))
+# New vectors are written in one transaction per batch, or once the oldest has waited this long
+EMBEDDING_SPILL_BATCH = int(os.getenv("EMBEDDING_SPILL_BATCH", "32"))
+EMBEDDING_SPILL_FLUSH_SECONDS = float(os.getenv("EMBEDDING_SPILL_FLUSH_SECONDS", "5"))
+
+
+def normalize_query(text: str) -> str:
+    # all-MiniLM-L6-v2 is uncased, so case and whitespace never change the vector
+    return " ".join(text.lower().split())
+
+
+class _SpillStore:
+    """SQLite file behind the in-memory LRU, shared by every worker process.
+
+    Each thread reads through its own connection; WAL lets readers and the single writer
+    proceed together, and ``busy_timeout`` absorbs other workers' commits. Writes are
+    buffered and committed in batches, and the table is capped at ``max_rows``.
+    """
+
+    def __init__(self, path: str, max_rows: int = EMBEDDING_SPILL_MAX_ROWS, batch: int = EMBEDDING_SPILL_BATCH,
+                 flush_seconds: float = EMBEDDING_SPILL_FLUSH_SECONDS):
+        self.path = path
+        self.max_rows = max_rows
+        self.batch = batch
+        self.flush_seconds = flush_seconds
+        self._local = local()
+        self._pending = []
+        self._pending_since = 0.0
+        self._write_lock = Lock()
+        self.write_errors = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS query_embeddings (query TEXT PRIMARY KEY, vector BLOB)")
+        conn.commit()
+        atexit.register(self.flush)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def read(self, key: str):
+        try:
+            row = self._conn().execute("SELECT vector FROM query_embeddings WHERE query = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        if row is None:
+            return None
+        return array("f", row[0]).tolist()
+
+    def write(self, key: str, vector: list[float]):
+        with self._write_lock:
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append((key, array("f", vector).tobytes()))
+            if len(self._pending) < self.batch and time.monotonic() - self._pending_since < self.flush_seconds:
+                return
+            rows, self._pending = self._pending, []
+        # Committed outside the lock; concurrent batches wait on SQLite's busy_timeout instead
+        self._commit(rows)
+
+    def flush(self):
+        with self._write_lock:
+            rows, self._pending = self._pending, []
+        if rows:
+            self._commit(rows)
+
+    def _commit(self, rows):
+        conn = self._conn()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO query_embeddings (query, vector) VALUES (?, ?)", rows)
+                # Rowids grow with every write, so this drops the oldest entries beyond the cap
+                conn.execute(
+                    "DELETE FROM query_embeddings WHERE rowid <= (SELECT MAX(rowid) FROM query_embeddings) - ?",
+                    (self.max_rows,),
+                )
+        except sqlite3.OperationalError as e:
+            # Still locked after busy_timeout: it is only a cache, so drop the batch
+            with self._write_lock:
+                self.write_errors += 1
+            print(f"⚠️ Embedding spill write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._write_lock:
+            return {
+                "pending": len(self._pending),
+                "max_rows": self.max_rows,
+                "write_errors": self.write_errors,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """LRU cache of query embeddings in front of another Embeddings model.
+
+    With ``spill_path`` set, computed vectors are also written to a bounded SQLite file and
+    looked up there on a memory miss, so the cache survives restarts. SQLite is only touched
+    outside the in-memory lock. Document embedding (ingestion) is passed straight through.
+    """
+
+    def __init__(self, base: Embeddings, max_entries: int = EMBEDDING_CACHE_SIZE, spill_path: str | None = EMBEDDING_CACHE_PATH):
+        self.base = base
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._spill = _SpillStore(spill_path) if spill_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector: list[float]):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        if self._spill is not None:
+            vector = self._spill.read(key)
+            if vector is not None:
+                with self._lock:
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        vector = self.base.embed_query(key)
+
+        with self._lock:
+            self._remember(key, vector)
+        if self._spill is not None:
+            self._spill.write(key, vector)
+        return vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.base.embed_documents(texts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            stats = {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "spill": self._spill is not None,
+            }
+        if self._spill is not None:
+            stats["spill_store"] = self._spill.stats()
+        return stats
@@ -1,66 +1,238 @@
-import cloudinary
-import cloudinary.uploader
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
 import base64
+import hashlib
 import io
+import re
 import fitz  # PyMuPDF
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
 import os
 from dotenv import load_dotenv
+from image_retriever import invalidate_document_images
 
 load_dotenv()
 
-# Cloudinary config
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
+ZOOM = 2  # Increase resolution
+IMAGE_STORAGE = os.getenv("IMAGE_STORAGE", "cloudinary")  # "cloudinary" or "local"
+IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", "4"))
 
 # MongoDB setup
 client = MongoClient("mongodb://localhost:27017/")
 db = client["ju_ece_chatbot"]
 image_collection = db["pdf_images"]
+_indexes_ready = False
 
-def extract_and_store_images(pdf_path, subject, year, semester):
-    doc = fitz.open(pdf_path)
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        
-        # Get page dimensions
-        zoom = 2  # Increase resolution
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Convert to PIL Image
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        # Create a BytesIO object for the image
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
-            img_byte_arr,
+def _ensure_indexes():
+    # Created on first ingestion rather than at import; the app creates them at startup too
+    global _indexes_ready
+    if not _indexes_ready:
+        image_collection.create_index([("content_hash", ASCENDING)])
+        image_collection.create_index([("document", ASCENDING), ("page", ASCENDING)])
+        _indexes_ready = True
+
+
+class CloudinaryStorage:
+    def __init__(self):
+        import cloudinary
+        import cloudinary.uploader
+
+        # Cloudinary config
+        cloudinary.config(
+            cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key=os.getenv("CLOUDINARY_API_KEY"),
+            api_secret=os.getenv("CLOUDINARY_API_SECRET")
+        )
+        self._uploader = cloudinary.uploader
+
+    def upload(self, png_bytes, content_hash):
+        # public_id is the content hash, so a retried upload overwrites instead of duplicating
+        upload_result = self._uploader.upload(
+            io.BytesIO(png_bytes),
             resource_type="image",
-            format="png"
+            format="png",
+            public_id=content_hash,
+            overwrite=True
         )
-        image_url = upload_result["secure_url"]
-
-        filename = f"{subject}_{year}_{semester}_page_{page_num+1}.png"
-        
-        image_doc = {
-            "subject": subject,
-            "year": year,
-            "semester": semester,
-            "page": page_num + 1,
-            "filename": filename,
-            "document": os.path.basename(pdf_path),
-            "image_url": image_url
-        }
-        image_collection.insert_one(image_doc)
-
-        print(f"✅ Uploaded and stored page {page_num + 1}: {filename} -> {image_url}")
+        return upload_result["secure_url"]
+
+
+class LocalImageStorage:
+    # Offline stand-in for Cloudinary: writes PNGs under IMAGE_LOCAL_DIR and returns file URLs
+    def __init__(self, root=None, base_url=None):
+        self.root = root or os.getenv("IMAGE_LOCAL_DIR", "./page_images")
+        self.base_url = base_url or os.getenv("IMAGE_LOCAL_BASE_URL")
+        os.makedirs(self.root, exist_ok=True)
+
+    def upload(self, png_bytes, content_hash):
+        path = os.path.join(self.root, f"{content_hash}.png")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(png_bytes)
+            os.replace(tmp_path, path)
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{content_hash}.png"
+        return f"file://{os.path.abspath(path)}"
+
+
+_storage = None
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = LocalImageStorage() if IMAGE_STORAGE == "local" else CloudinaryStorage()
+    return _storage
+
+
+# Indirect references inside an object's source
+_REF_RE = re.compile(rb"(\d+)\s+\d+\s+R")
+# References that do not affect how the page renders: back up the page tree (/Parent, /P),
+# link destinations and actions into other pages (/Dest, /D, /A, /Next), annotation threads
+_SKIPPED_REF_RE = re.compile(
+    rb"/(?:Parent|P|Dest|D|A|Next|IRT|Popup|B)\s*(?:\d+\s+\d+\s+R|\[[^\]]*?\d+\s+\d+\s+R[^\]]*\])"
+)
+
+
+def _object_digest(doc, xref, memo, visiting=()):
+    # Merkle digest of an object and everything it references (form XObjects, fonts, images,
+    # annotations...). References are replaced by their targets' digests, so the same content
+    # hashes equal whatever object numbers the PDF assigned it.
+    if xref in memo:
+        return memo[xref]
+    if xref in visiting:
+        return b"cycle"
+    source = _SKIPPED_REF_RE.sub(b"", doc.xref_object(xref, compressed=True).encode())
+    h = hashlib.sha256()
+    h.update(_REF_RE.sub(lambda m: _object_digest(doc, int(m.group(1)), memo, visiting + (xref,)).hex().encode(), source))
+    if doc.xref_is_stream(xref):
+        h.update(doc.xref_stream_raw(xref) or b"")
+    memo[xref] = h.digest()
+    return memo[xref]
+
+
+def _inherited_resources(doc, xref) -> bytes:
+    # Pages without their own /Resources use the nearest ancestor's
+    while True:
+        kind, value = doc.xref_get_key(xref, "Parent")
+        if kind != "xref":
+            return b""
+        xref = int(value.split()[0])
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind != "null":
+            return value.encode()
 
+
+def page_content_hash(doc, page, memo=None):
+    # Hash of everything that determines the render: the page object with its content streams
+    # and resolved resources (form XObjects, fonts, images, annotations), page geometry and zoom.
+    # Identical pages hash equal across files and re-uploads. `memo` shares digests of
+    # resources used by several pages of the same document.
+    memo = {} if memo is None else memo
+    h = hashlib.sha256()
+    h.update(f"zoom={ZOOM};rect={tuple(page.rect)};rotation={page.rotation}".encode())
+    h.update(_object_digest(doc, page.xref, memo))
+    if doc.xref_get_key(page.xref, "Resources")[0] == "null":
+        resources = _inherited_resources(doc, page.xref)
+        h.update(_REF_RE.sub(lambda m: _object_digest(doc, int(m.group(1)), memo).hex().encode(), resources))
+    return h.hexdigest()
+
+
+def _render_png(page):
+    mat = fitz.Matrix(ZOOM, ZOOM)
+    pix = page.get_pixmap(matrix=mat)
+
+    # Convert to PIL Image
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+    # Create a BytesIO object for the image
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format='PNG')
+    return img_byte_arr.getvalue()
+
+
+def _upload_and_record(storage, png_bytes, record_key, image_doc, slots):
+    try:
+        image_url = storage.upload(png_bytes, image_doc["content_hash"])
+        image_doc["image_url"] = image_url
+        image_collection.update_one(record_key, {"$set": image_doc}, upsert=True)
+        print(f"✅ Uploaded and stored page {image_doc['page']}: {image_doc['filename']} -> {image_url}")
+    finally:
+        slots.release()
+
+
+def extract_and_store_images(pdf_path, subject, year, semester):
+    _ensure_indexes()
+    document = os.path.basename(pdf_path)
+    existing = {
+        rec["page"]: rec
+        for rec in image_collection.find(
+            {"document": document, "subject": subject, "year": year, "semester": semester},
+            {"page": 1, "content_hash": 1, "image_url": 1}
+        )
+    }
+
+    storage = get_storage()
+    # Rendering stays on this thread (PyMuPDF documents aren't thread-safe); uploads go to a
+    # bounded pool, and the semaphore caps rendered-but-not-uploaded pages held in memory.
+    slots = BoundedSemaphore(IMAGE_UPLOAD_WORKERS * 2)
+    futures = []
+    skipped = 0
+    doc = fitz.open(pdf_path)
+    digests = {}
+    with ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_WORKERS) as pool:
+        for page_num in range(len(doc)):
+            page = doc.load_page(page_num)
+            content_hash = page_content_hash(doc, page, digests)
+
+            previous = existing.get(page_num + 1)
+            if previous and previous.get("content_hash") == content_hash and previous.get("image_url"):
+                skipped += 1
+                continue
+
+            filename = f"{subject}_{year}_{semester}_page_{page_num+1}.png"
+            record_key = {
+                "document": document,
+                "subject": subject,
+                "year": year,
+                "semester": semester,
+                "page": page_num + 1
+            }
+            image_doc = dict(record_key, filename=filename, content_hash=content_hash)
+
+            # Same page content already uploaded elsewhere (another copy of the PDF): reuse its URL
+            same_content = image_collection.find_one(
+                {"content_hash": content_hash, "image_url": {"$exists": True}},
+                {"image_url": 1}
+            )
+            if same_content:
+                image_doc["image_url"] = same_content["image_url"]
+                image_collection.update_one(record_key, {"$set": image_doc}, upsert=True)
+                skipped += 1
+                continue
+
+            png_bytes = _render_png(page)
+            slots.acquire()
+            futures.append(pool.submit(_upload_and_record, storage, png_bytes, record_key, image_doc, slots))
+
+        for future in futures:
+            future.result()
+
+    # Drop records for pages that no longer exist (the PDF got shorter)
+    image_collection.delete_many({
+        "document": document, "subject": subject, "year": year, "semester": semester,
+        "page": {"$gt": len(doc)}
+    })
+    print(f"🖼️ {document}: {len(futures)} pages uploaded, {skipped} unchanged pages skipped")
     doc.close()
+    invalidate_document_images(document)
+
+def delete_images(document, subject, year, semester):
+    result = image_collection.delete_many({
+        "document": document,
+        "subject": subject,
+        "year": year,
+        "semester": semester
+    })
+    invalidate_document_images(document)
+    return result.deleted_count
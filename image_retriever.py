@@ -1,32 +1,116 @@
-from pymongo import MongoClient
-from collections import defaultdict
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, ASCENDING
+from collections import OrderedDict
+from threading import Lock
+from dotenv import load_dotenv
+import os
+import time
 
-client = MongoClient("mongodb://localhost:27017/")
-db = client["ju_ece_chatbot"]
-image_collection = db["pdf_images"]
+load_dotenv()
 
-def get_images_by_doc_and_pages(document_name, page_numbers):
-    query = {
-        "document": document_name,
-        "page": {"$in": page_numbers}
-    }
+MONGO_URL = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+DB_NAME = "ju_ece_chatbot"
+IMAGES_PER_PAGE = 3  # Take up to first 3 images of each page
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "300"))
+IMAGE_CACHE_DOCUMENTS = int(os.getenv("IMAGE_CACHE_DOCUMENTS", "256"))
 
-    results = list(image_collection.find(query))
+client = MongoClient(MONGO_URL)
+image_collection = client[DB_NAME]["pdf_images"]
 
-    # Group by page number
-    grouped = defaultdict(list)
-    for img in results:
-        grouped[img["page"]].append(img)
+async_client = AsyncIOMotorClient(MONGO_URL)
+async_image_collection = async_client[DB_NAME]["pdf_images"]
 
-    final_images = []
-    for page, images in grouped.items():
-        selected_images = images[:3]  # Take up to first 3 images
-        for img in selected_images:
-            final_images.append({
-                "image_url": img["image_url"],
-                "page": img["page"],
-                "filename": img["filename"],
-                "document": img["document"]
-            })
+_FIELDS = {"_id": 0, "image_url": 1, "page": 1, "filename": 1, "document": 1}
+_SORT = [("page", ASCENDING), ("_id", ASCENDING)]
+
+async def ensure_image_indexes():
+    # (document, page) serves the per-document load below; content_hash serves ingestion dedup
+    await async_image_collection.create_index([("document", ASCENDING), ("page", ASCENDING)])
+    await async_image_collection.create_index([("content_hash", ASCENDING)])
+
+
+class _DocumentImageCache:
+    """document -> {page: [image dicts]} for recently used documents.
+
+    A whole document is loaded at once, so answers citing any of its pages are served from
+    memory. Entries expire after ``ttl_seconds`` (ingestion in another process) and are
+    dropped immediately by ``invalidate`` (ingestion in this process).
+    """
+
+    def __init__(self, ttl_seconds: float = IMAGE_CACHE_TTL, max_documents: int = IMAGE_CACHE_DOCUMENTS):
+        self.ttl_seconds = ttl_seconds
+        self.max_documents = max_documents
+        self._entries = OrderedDict()  # document -> (loaded_at, pages)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, document):
+        with self._lock:
+            entry = self._entries.get(document)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(document)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, document, pages):
+        with self._lock:
+            self._entries[document] = (time.monotonic(), pages)
+            self._entries.move_to_end(document)
+            while len(self._entries) > self.max_documents:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, document=None):
+        with self._lock:
+            if document is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(document, None)
 
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "documents": len(self._entries),
+                "max_documents": self.max_documents,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+image_cache = _DocumentImageCache()
+
+def invalidate_document_images(document=None):
+    image_cache.invalidate(document)
+
+def _group_by_page(records):
+    pages = {}
+    for img in records:
+        images = pages.setdefault(img["page"], [])
+        if len(images) < IMAGES_PER_PAGE:
+            images.append(img)
+    return pages
+
+def _select(pages, page_numbers):
+    final_images = []
+    for page in sorted(set(page_numbers)):
+        final_images.extend(pages.get(page, ()))
     return final_images
+
+def get_images_by_doc_and_pages(document_name, page_numbers):
+    pages = image_cache.get(document_name)
+    if pages is None:
+        pages = _group_by_page(image_collection.find({"document": document_name}, _FIELDS).sort(_SORT))
+        image_cache.put(document_name, pages)
+    return _select(pages, page_numbers)
+
+async def aget_images_by_doc_and_pages(document_name, page_numbers):
+    pages = image_cache.get(document_name)
+    if pages is None:
+        cursor = async_image_collection.find({"document": document_name}, _FIELDS).sort(_SORT)
+        pages = _group_by_page(await cursor.to_list(length=None))
+        image_cache.put(document_name, pages)
+    return _select(pages, page_numbers)
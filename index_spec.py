@@ -0,0 +1,111 @@
+from dotenv import load_dotenv
+import json
+import os
+import faiss
+import numpy as np
+
+load_dotenv()
+
+# Default for stores created without an explicit spec (e.g. first admin upload of a subject)
+DEFAULT_INDEX_SPEC = os.getenv("VECTORSTORE_INDEX_SPEC", "flat")
+INDEX_SPEC_FILE = "index_spec.json"
+
+INDEX_TYPES = {
+    "flat": {},
+    "hnsw": {"M": 32, "efConstruction": 80, "efSearch": 64},
+    "ivf": {"nlist": 256, "nprobe": 16},
+    "ivfpq": {"nlist": 256, "m": 16, "nbits": 8, "nprobe": 16},
+}
+# Parameters that only affect search and are re-applied after loading
+SEARCH_PARAMS = ("efSearch", "nprobe")
+
+
+def parse_index_spec(spec) -> dict:
+    """Accepts "flat", "hnsw:M=32,efSearch=64", "ivf:nlist=256,nprobe=16",
+    "ivfpq:nlist=256,m=16,nbits=8,nprobe=16" or an already-parsed dict."""
+    if isinstance(spec, dict):
+        return spec
+    name, _, raw_params = (spec or "flat").partition(":")
+    name = name.strip().lower()
+    if name not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{name}', expected one of {sorted(INDEX_TYPES)}")
+
+    parsed = {"type": name, **INDEX_TYPES[name]}
+    for item in filter(None, (p.strip() for p in raw_params.split(","))):
+        key, _, value = item.partition("=")
+        if key not in INDEX_TYPES[name]:
+            raise ValueError(f"Unknown parameter '{key}' for {name} index")
+        parsed[key] = int(value)
+    return parsed
+
+
+def format_index_spec(spec: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in spec.items() if k != "type")
+    return f"{spec['type']}:{params}" if params else spec["type"]
+
+
+def make_index(spec, vectors: np.ndarray):
+    """Builds, trains and fills a FAISS index for `vectors` (float32, shape (n, d))."""
+    spec = parse_index_spec(spec)
+    n, dim = vectors.shape
+
+    if spec["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec["M"])
+        index.hnsw.efConstruction = spec["efConstruction"]
+    elif spec["type"] in ("ivf", "ivfpq"):
+        if spec["type"] == "ivfpq" and n < 2 ** spec["nbits"]:
+            print(f"⚠️ {n} vectors are too few to train PQ codebooks; using a flat index")
+            return make_index("flat", vectors)
+        # Each list needs training points; shrink nlist for small corpora
+        nlist = max(1, min(spec["nlist"], n // 39 or 1))
+        quantizer = faiss.IndexFlatL2(dim)
+        if spec["type"] == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, spec["m"], spec["nbits"])
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlatL2(dim)
+
+    if n:
+        index.add(vectors)
+    apply_search_params(index, spec)
+    return index
+
+
+def apply_search_params(index, spec):
+    spec = parse_index_spec(spec)
+    params = faiss.ParameterSpace()
+    for key in SEARCH_PARAMS:
+        if key in spec:
+            params.set_index_parameter(index, key, spec[key])
+
+
+def all_vectors(index) -> np.ndarray:
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def save_index_spec(spec, persist_path):
+    path = os.path.join(persist_path, INDEX_SPEC_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(parse_index_spec(spec), f)
+    os.replace(path + ".tmp", path)
+
+
+def load_index_spec(persist_path) -> dict:
+    path = os.path.join(persist_path, INDEX_SPEC_FILE)
+    if not os.path.exists(path):
+        return parse_index_spec("flat")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def apply_index_spec(vectorstore, persist_path):
+    # nprobe / efSearch are search-time settings; set them on every load
+    apply_search_params(vectorstore.index, load_index_spec(persist_path))
+    return vectorstore
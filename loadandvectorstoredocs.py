@@ -1,6 +1,12 @@
-from documentloader import load_documents
+from documentloader import load_documents, load_document
 from splitter_vectorstore import split_documents, build_vectorstore
+from index_spec import DEFAULT_INDEX_SPEC
+from ocr import is_progress_file, set_worker_budget
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import multiprocessing
 import os
+import time
 
 # List of all subjects in 3rd year, 1st semester
 subjects = [
@@ -49,6 +55,90 @@ def process_subject(subject):
         print(doc.page_content[:300])
         print("Metadata:", doc.metadata)
 
+# ---- Bulk ingestion ----
+# Parsing, OCR and page-image rendering run per file in a process pool; embedding then runs
+# per subject with large batches. Each stage reports its throughput.
+
+class StageTimer:
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.pages = 0
+        self.chunks = 0
+
+    def report(self):
+        seconds = max(self.seconds, 1e-9)
+        print(
+            f"⏱️ {self.name}: {self.seconds:.1f}s, "
+            f"{self.pages} pages ({self.pages / seconds:.1f} pages/sec), "
+            f"{self.chunks} chunks ({self.chunks / seconds:.1f} chunks/sec)"
+        )
+
+def _load_and_split(subject, file_path):
+    # Runs in a worker process
+    docs = load_document(file_path, year=year, semester=semester, subject=subject)
+    chunks = split_documents(docs)
+    return subject, file_path, len(docs), chunks
+
+def bulk_main(subject_list, workers=None, batch_size=256, index_spec=None):
+    print(f"🚀 Bulk processing {len(subject_list)} subjects with {workers or os.cpu_count()} workers...")
+    os.makedirs("vectorstores", exist_ok=True)
+
+    jobs = []
+    for subject in subject_list:
+        base_path = f"./data/year_{year}/sem_{semester}/subject_{subject}"
+        if not os.path.isdir(base_path):
+            print(f"⚠️ No data directory for {subject}: {base_path}")
+            continue
+        jobs.extend(
+            (subject, os.path.join(base_path, name))
+            for name in sorted(os.listdir(base_path)) if not is_progress_file(name)
+        )
+
+    # Stage 1: parse + OCR + image extraction + split, parallel across files
+    parse_stage = StageTimer("parse/OCR/images/split")
+    chunks_by_subject = {subject: [] for subject in subject_list}
+    start = time.perf_counter()
+    # spawn: the loaders hold Mongo clients and torch state that must not be forked
+    # Each file worker gets an equal share of the cores for scanned-PDF OCR, so nested
+    # OCR pools never multiply into workers x OCR_WORKERS processes
+    ocr_budget = max(1, (os.cpu_count() or 1) // (workers or os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=set_worker_budget, initargs=(ocr_budget,)) as pool:
+        futures = {pool.submit(_load_and_split, subject, path): path for subject, path in jobs}
+        for future in as_completed(futures):
+            try:
+                subject, file_path, page_count, chunks = future.result()
+            except Exception as e:
+                print(f"❌ Error loading {futures[future]}: {e}")
+                continue
+            chunks_by_subject[subject].extend(chunks)
+            parse_stage.pages += page_count
+            parse_stage.chunks += len(chunks)
+            print(f"📄 {os.path.basename(file_path)}: {page_count} pages, {len(chunks)} chunks")
+    parse_stage.seconds = time.perf_counter() - start
+    parse_stage.report()
+
+    # Stage 2: embed + build index, one subject at a time so each batch uses every core
+    embed_stage = StageTimer(f"embed/index (batch_size={batch_size}, index={index_spec or DEFAULT_INDEX_SPEC})")
+    for subject, chunks in chunks_by_subject.items():
+        if not chunks:
+            continue
+        persist_path = f"vectorstores/{subject}_{year}_{semester}"
+        start = time.perf_counter()
+        try:
+            build_vectorstore(chunks, persist_path=persist_path, batch_size=batch_size, index_spec=index_spec)
+        except Exception as e:
+            print(f"❌ Error building vectorstore for {subject}: {str(e)}")
+            continue
+        elapsed = time.perf_counter() - start
+        embed_stage.seconds += elapsed
+        embed_stage.chunks += len(chunks)
+        print(f"✅ {subject}: {len(chunks)} chunks embedded in {elapsed:.1f}s ({len(chunks) / max(elapsed, 1e-9):.1f} chunks/sec)")
+    embed_stage.report()
+
+    print("\n✨ Bulk processing completed!")
+
 def main():
     print("🚀 Starting document processing for all subjects...")
     
@@ -69,4 +159,19 @@ def main():
     print("\n✨ All subjects processing completed!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build vectorstores for the configured subjects")
+    parser.add_argument("--bulk", action="store_true", help="parallel, batched ingestion")
+    parser.add_argument("--subjects", nargs="+", default=subjects)
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=256, help="embedding batch size")
+    parser.add_argument(
+        "--index-spec", default=None,
+        help='FAISS index, e.g. "flat", "hnsw:M=32,efSearch=64", "ivfpq:nlist=256,m=16,nbits=8,nprobe=16"',
+    )
+    args = parser.parse_args()
+
+    if args.bulk:
+        bulk_main(args.subjects, workers=args.workers, batch_size=args.batch_size, index_spec=args.index_spec)
+    else:
+        subjects = args.subjects
+        main()
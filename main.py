@@ -1,16 +1,29 @@
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
 from pydantic import BaseModel, EmailStr
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 import logging
-from auth import create_access_token, create_refresh_token, refresh_access_token, get_current_user, get_current_admin
-from datetime import timedelta
-from chat_engine import get_chat_response
-from multimodal import extract_text_and_images_from_pdf, extract_text_from_image
+from auth import create_access_token, create_refresh_token, refresh_access_token, get_current_user, get_current_admin, invalidate_user, revoke_token, oauth2_scheme, ensure_auth_indexes
+from datetime import datetime, timedelta
+from chat_engine import aget_chat_response, astream_chat_response, reranker, embedding_model
+from upload_extraction import MULTIMODAL_SYNC_MAX_BYTES, SUPPORTED_UPLOADS, ensure_extraction_indexes, extraction_jobs
 from models.user import User, UserRole
-from database import users_collection, pwd_context
+from database import users_collection, password_hasher
+from password_hashing import HashingOverloaded
+from memory_handler import ensure_memory_indexes
+from chat_log import ensure_chat_indexes, list_chats, log_chat, search_chats as search_chat_log
+from query_stats import ensure_stats_indexes, get_total_queries, get_top_queries, get_recent_activity, get_query_series
 from typing import Optional, List
-from documentloader import load_documents
-from splitter_vectorstore import split_documents, build_vectorstore
+from documentloader import load_document
+from splitter_vectorstore import split_documents, replace_document_in_vectorstore, remove_document_from_vectorstore
+from image_extractor import delete_images
+from ocr import discard_progress as discard_ocr_progress
+from image_retriever import ensure_image_indexes, image_cache
+from vectorstore_cache import vectorstore_cache
+from answer_cache import answer_cache
+from principal_cache import principal_cache
+import asyncio
+import glob
 import os
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
@@ -27,6 +40,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(HashingOverloaded)
+async def hashing_overloaded(request, exc: HashingOverloaded):
+    # Shed login/register bursts rather than queueing them behind every other request
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_chat_indexes()
+    await ensure_stats_indexes()
+    await ensure_memory_indexes()
+    await ensure_extraction_indexes()
+    await ensure_image_indexes()
+    await ensure_auth_indexes()
+
 class LoginUser(BaseModel):
     username: str
     password: str
@@ -83,7 +114,7 @@ async def register(user: UserCreate):
     if await users_collection.find_one({"username": user.username}):
         raise HTTPException(status_code=400, detail="User already exists")
     
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     
     new_user = User(
         username=user.username,
@@ -111,10 +142,15 @@ async def login(user: LoginUser):
         print(f"No user found in database for: {user.username}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not pwd_context.verify(user.password, db_user["password"]):
+    if not await password_hasher.verify(user.password, db_user["password"]):
         print(f"Password verification failed for user: {user.username}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    if password_hasher.needs_update(db_user["password"]):
+        async def _save_hash(new_hash):
+            await users_collection.update_one({"_id": db_user["_id"]}, {"$set": {"password": new_hash}})
+        password_hasher.rehash_in_background(user.password, _save_hash)
+
     # Get user role from database
     user_role = db_user.get("role", UserRole.USER)
     print(f"User role from database: {user_role}")  # Debug log
@@ -153,6 +189,12 @@ async def refresh_token(refresh_token_data: RefreshToken):
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
+@app.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme), current_user: User = Depends(get_current_user)):
+    # Refuses this access token for the rest of its lifetime
+    await revoke_token(token)
+    return {"message": "Logged out successfully"}
+
 @app.put("/update_profile")
 async def update_profile(update: UpdateProfileRequest, current_user: User = Depends(get_current_user)):
     update_fields = {}
@@ -175,8 +217,9 @@ async def update_profile(update: UpdateProfileRequest, current_user: User = Depe
         {"username": current_user.username},
         {"$set": update_fields}
     )
+    invalidate_user(current_user.username)
 
-    updated_user = await users_collection.find_one({"username": current_user.username})
+    updated_user = await users_collection.find_one({"username": current_user.username}, {"chats": 0})
     user_data = {
         "username": updated_user["username"],
         "email": updated_user["email"],
@@ -209,28 +252,55 @@ async def get_profile(current_user: User = Depends(get_current_user)):
 
 @app.post("/save_chat")
 async def save_chat(chat: Chat, current_user: User = Depends(get_current_user)):
-    await users_collection.update_one(
-        {"username": current_user.username},
-        {"$push": {"chats": chat.dict()}}
-    )
+    await log_chat(current_user.username, chat.dict())
     return {"message": "Chat saved"}
 
 @app.get("/search_chats")
-async def search_chats(query: str, current_user: User = Depends(get_current_user)):
-    user = await users_collection.find_one({"username": current_user.username})
-    if not user or "chats" not in user:
-        return {"matches": []}
+async def search_chats(
+    query: str,
+    subject: Optional[str] = None,
+    semester: Optional[str] = None,
+    session_id: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    # An empty query lists the user's turns session by session (the chat history sidebar)
+    try:
+        if not query.strip():
+            matches, next_cursor = await list_chats(
+                current_user.username,
+                subject=subject,
+                semester=semester,
+                session_id=session_id,
+                limit=max(1, min(limit, 100)),
+                cursor=cursor
+            )
+            return {"matches": matches, "next_cursor": next_cursor}
+
+        matches, next_cursor = await search_chat_log(
+            current_user.username,
+            query,
+            subject=subject,
+            semester=semester,
+            session_id=session_id,
+            limit=max(1, min(limit, 100)),
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"matches": matches, "next_cursor": next_cursor}
+
+async def _save_chat_turn(username: str, entry: dict):
+    await log_chat(username, entry)
 
-    matches = [
-        chat for chat in user["chats"]
-        if query.lower() in chat["question"].lower() or query.lower() in chat["answer"].lower()
-    ]
-    return {"matches": matches}
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.post("/start_chat")
 async def start_chat(request: ChatRequest, current_user: User = Depends(get_current_user)):
     try:
-        result = get_chat_response(
+        result = await aget_chat_response(
             current_user.username,
             request.question,
             request.session_id,
@@ -239,23 +309,59 @@ async def start_chat(request: ChatRequest, current_user: User = Depends(get_curr
             request.subject
         )
 
-        await users_collection.update_one(
-            {"username": current_user.username},
-            {"$push": {"chats": {
-                "session_id": request.session_id,
-                "year": request.year,
-                "semester": request.semester,
-                "subject": request.subject,
-                "question": request.question,
-                "answer": result["answer"],
-                "images": result["images"]
-            }}}
-        )
+        await _save_chat_turn(current_user.username, {
+            "session_id": request.session_id,
+            "year": request.year,
+            "semester": request.semester,
+            "subject": request.subject,
+            "question": request.question,
+            "answer": result["answer"],
+            "images": result["images"]
+        })
 
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/start_chat/stream")
+async def start_chat_stream(request: ChatRequest, current_user: User = Depends(get_current_user)):
+    # Server-Sent Events: "token" events while the answer is generated, then a final
+    # "images" event once the turn is saved. Failures are reported as an "error" event.
+    async def event_stream():
+        answer_parts = []
+        try:
+            async for event, data in astream_chat_response(
+                current_user.username,
+                request.question,
+                request.session_id,
+                request.year,
+                request.semester,
+                request.subject
+            ):
+                if event == "token":
+                    answer_parts.append(data)
+                    yield _sse("token", {"text": data})
+                elif event == "images":
+                    await _save_chat_turn(current_user.username, {
+                        "session_id": request.session_id,
+                        "year": request.year,
+                        "semester": request.semester,
+                        "subject": request.subject,
+                        "question": request.question,
+                        "answer": "".join(answer_parts),
+                        "images": data
+                    })
+                    yield _sse("images", {"images": data})
+        except Exception as e:
+            logging.error(f"Error in start_chat_stream: {str(e)}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/multimodal_chat")
 async def multimodal_chat(
     question: str = Form(...),
@@ -263,47 +369,72 @@ async def multimodal_chat(
     year: str = Form(...),
     semester: str = Form(...),
     subject: str = Form(...),
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    job_id: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user)
 ):
-    file_ext = file.filename.split(".")[-1].lower()
-    contents = await file.read()
-
-    if file_ext == "pdf":
-        text, ocr_text = extract_text_and_images_from_pdf(contents)
-        extracted_text = f"{text}\n\n[Image Text]\n{ocr_text}"
-    elif file_ext in ["png", "jpg", "jpeg"]:
-        extracted_text = extract_text_from_image(contents)
+    # Either a fresh upload, or the job_id of a large upload whose extraction has finished
+    if job_id:
+        job = extraction_jobs.get(job_id, current_user.username)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Extraction job not found")
+        if job["status"] == "failed":
+            raise HTTPException(status_code=422, detail=f"Could not extract file content: {job['error']}")
+        if job["status"] != "done":
+            return JSONResponse(status_code=202, content=extraction_jobs.public(job))
+        filename = job["filename"]
+        extracted_text = job["text"]
+    elif file is not None:
+        filename = file.filename
+        file_ext = filename.split(".")[-1].lower()
+        if file_ext not in SUPPORTED_UPLOADS:
+            raise HTTPException(status_code=400, detail="Unsupported file type")
+        contents = await file.read()
+
+        # Repeat uploads are answered straight from the cache, whatever their size
+        extracted_text = await extraction_jobs.cached_text(contents)
+        if extracted_text is None:
+            if len(contents) > MULTIMODAL_SYNC_MAX_BYTES:
+                # Too slow to OCR inside the request; the client polls /multimodal_jobs/{job_id}
+                # and re-posts with job_id
+                job = extraction_jobs.start(current_user.username, filename, file_ext, contents)
+                return JSONResponse(status_code=202, content=extraction_jobs.public(job))
+            extracted_text = await extraction_jobs.extract(file_ext, contents)
     else:
-        raise HTTPException(status_code=400, detail="Unsupported file type")
+        raise HTTPException(status_code=400, detail="Either file or job_id is required")
 
     combined_prompt = f"{question}\n\n[File Content]\n{extracted_text}"
 
-    result = get_chat_response(
+    result = await aget_chat_response(
         username=current_user.username,
         question=combined_prompt,
         session_id=session_id,
         year=year,
         semester=semester,
-        subject=subject
+        subject=subject,
+        use_answer_cache=False
     )
 
-    await users_collection.update_one(
-        {"username": current_user.username},
-        {"$push": {"chats": {
-            "session_id": session_id,
-            "question": question,
-            "file_used": file.filename,
-            "answer": result["answer"],
-            "images": result["images"],
-            "year": year,
-            "semester": semester,
-            "subject": subject
-        }}}
-    )
+    await _save_chat_turn(current_user.username, {
+        "session_id": session_id,
+        "question": question,
+        "file_used": filename,
+        "answer": result["answer"],
+        "images": result["images"],
+        "year": year,
+        "semester": semester,
+        "subject": subject
+    })
 
     return result
 
+@app.get("/multimodal_jobs/{job_id}")
+async def get_multimodal_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = extraction_jobs.get(job_id, current_user.username)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Extraction job not found")
+    return extraction_jobs.public(job)
+
 # Admin Routes
 @app.get("/admin/metrics", response_model=DashboardMetrics)
 async def get_dashboard_metrics(current_user: User = Depends(get_current_user)):
@@ -311,42 +442,13 @@ async def get_dashboard_metrics(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=401, detail="Not authorized")
     
     try:
-        # Get total users
-        total_users = await users_collection.count_documents({})
-        
-        # Get all users to count their queries
-        users = await users_collection.find({}).to_list(length=None)
-        
-        # Count total queries from all users' chat history
-        total_queries = sum(len(user.get("chats", [])) for user in users)
-        
-        # Get top queries by counting occurrences
-        query_counts = {}
-        for user in users:
-            for chat in user.get("chats", []):
-                question = chat.get("question", "").lower()
-                if question:
-                    query_counts[question] = query_counts.get(question, 0) + 1
-        
-        # Sort and get top 5 queries
-        top_queries = [
-            {"query": query, "count": count}
-            for query, count in sorted(query_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        ]
-        
-        # Get recent activity (last 10 chats across all users)
-        recent_activity = []
-        for user in users:
-            for chat in user.get("chats", [])[-10:]:  # Get last 10 chats per user
-                recent_activity.append({
-                    "query": chat.get("question", ""),
-                    "timestamp": chat.get("timestamp", ""),
-                    "username": user.get("username", "")
-                })
-        
-        # Sort recent activity by timestamp (most recent first)
-        recent_activity.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        recent_activity = recent_activity[:10]  # Keep only the 10 most recent
+        # Every figure comes from an index or a counter document maintained on chat writes
+        total_users, total_queries, top_queries, recent_activity = await asyncio.gather(
+            users_collection.estimated_document_count(),
+            get_total_queries(),
+            get_top_queries(5),
+            get_recent_activity(10)
+        )
         
         # Count total PDFs (assuming PDFs are stored in a separate collection)
         total_pdfs = 0  # TODO: Implement PDF counting when PDF storage is set up
@@ -370,6 +472,70 @@ async def get_pdfs(current_user: User = Depends(get_current_user)):
     # TODO: Implement PDF listing from your storage
     return []
 
+# Serializes index updates per subject so concurrent admin actions don't overwrite each other
+_index_locks = {}
+
+def _subject_dir(year: str, semester: str, subject: str) -> str:
+    return f"./data/year_{year}/sem_{semester}/subject_{subject}"
+
+def _vectorstore_path(year: str, semester: str, subject: str) -> str:
+    return f"vectorstores/{subject}_{year}_{semester}"
+
+def _locate_pdf(filename: str, year: Optional[str], semester: Optional[str], subject: Optional[str]):
+    if os.path.basename(filename) != filename or not filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Invalid PDF filename")
+
+    pattern = os.path.join(
+        "./data",
+        f"year_{year}" if year else "year_*",
+        f"sem_{semester}" if semester else "sem_*",
+        f"subject_{subject}" if subject else "subject_*",
+        glob.escape(filename)
+    )
+    matches = glob.glob(pattern)
+    if not matches:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    if len(matches) > 1:
+        raise HTTPException(status_code=409, detail="PDF exists in several subjects; specify year, semester and subject")
+
+    subject_dir, _ = os.path.split(matches[0])
+    sem_dir, subject_part = os.path.split(subject_dir)
+    year_dir, sem_part = os.path.split(sem_dir)
+    year_part = os.path.basename(year_dir)
+    return (
+        matches[0],
+        year_part[len("year_"):],
+        sem_part[len("sem_"):],
+        subject_part[len("subject_"):]
+    )
+
+def _unindex_pdf(filename: str, year: str, semester: str, subject: str) -> int:
+    delete_images(filename, subject, year, semester)
+    return remove_document_from_vectorstore(_vectorstore_path(year, semester, subject), filename)
+
+def _index_pdf(file_path: str, year: str, semester: str, subject: str) -> int:
+    # Swaps in this one document's chunks and page images; the rest of the subject is untouched
+    # Page images are upserted by content hash, so unchanged pages are neither re-rendered nor re-uploaded
+    filename = os.path.basename(file_path)
+    docs = load_document(file_path, year=year, semester=semester, subject=subject)
+    chunks = split_documents(docs)
+
+    os.makedirs("vectorstores", exist_ok=True)
+    # Old chunks are removed and new ones added on one loaded store, with a single save
+    replace_document_in_vectorstore(chunks, _vectorstore_path(year, semester, subject), filename)
+    return len(chunks)
+
+def _invalidate_subject_caches(year: str, semester: str, subject: str):
+    vectorstore_cache.invalidate((subject, year, semester))
+    answer_cache.invalidate((subject, year, semester))
+
+async def _run_index_update(year: str, semester: str, subject: str, fn, *args):
+    lock = _index_locks.setdefault((subject, year, semester), asyncio.Lock())
+    async with lock:
+        result = await asyncio.to_thread(fn, *args)
+    _invalidate_subject_caches(year, semester, subject)
+    return result
+
 @app.post("/admin/pdfs/upload")
 async def upload_pdf(
     file: UploadFile = File(...),
@@ -386,25 +552,18 @@ async def upload_pdf(
     
     try:
         # Create directory structure if it doesn't exist
-        base_path = f"./data/year_{year}/sem_{semester}/subject_{subject}"
+        base_path = _subject_dir(year, semester, subject)
         os.makedirs(base_path, exist_ok=True)
         
         # Save the file with its original filename
-        file_path = os.path.join(base_path, file.filename)
+        file_path = os.path.join(base_path, os.path.basename(file.filename))
         contents = await file.read()
         with open(file_path, "wb") as f:
             f.write(contents)
         
-        # Load documents
-        docs = load_documents(year=year, semester=semester, subject=subject)
-        
-        # Split into chunks
-        chunks = split_documents(docs)
-        
-        # Build and persist vectorstore
-        persist_path = f"vectorstores/{subject}_{year}_{semester}"
-        os.makedirs("vectorstores", exist_ok=True)
-        vectorstore = build_vectorstore(chunks, persist_path=persist_path)
+        # Index only the new document into the subject's vectorstore
+        chunk_count = await _run_index_update(year, semester, subject, _index_pdf, file_path, year, semester, subject)
+        persist_path = _vectorstore_path(year, semester, subject)
         
         return {
             "message": "PDF uploaded and processed successfully",
@@ -413,6 +572,7 @@ async def upload_pdf(
                 "year": year,
                 "semester": semester,
                 "subject": subject,
+                "chunks": chunk_count,
                 "vectorstore_path": persist_path
             }
         }
@@ -424,33 +584,88 @@ async def upload_pdf(
 @app.delete("/admin/pdfs/{filename}")
 async def delete_pdf(
     filename: str,
+    year: Optional[str] = None,
+    semester: Optional[str] = None,
+    subject: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # TODO: Implement PDF deletion from your storage
-    return {"message": "PDF deleted successfully"}
+    file_path, year, semester, subject = _locate_pdf(filename, year, semester, subject)
+    try:
+        removed = await _run_index_update(year, semester, subject, _unindex_pdf, filename, year, semester, subject)
+        os.remove(file_path)
+        discard_ocr_progress(file_path)
+    except Exception as e:
+        logging.error(f"Error in delete_pdf: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to delete PDF: {str(e)}")
+
+    return {"message": "PDF deleted successfully", "chunks_removed": removed}
 
 @app.post("/admin/pdfs/{filename}/reprocess")
 async def reprocess_pdf(
     filename: str,
+    year: Optional[str] = None,
+    semester: Optional[str] = None,
+    subject: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # TODO: Implement PDF reprocessing
-    return {"message": "PDF reprocessed successfully"}
+    file_path, year, semester, subject = _locate_pdf(filename, year, semester, subject)
+    try:
+        chunk_count = await _run_index_update(year, semester, subject, _index_pdf, file_path, year, semester, subject)
+    except Exception as e:
+        logging.error(f"Error in reprocess_pdf: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to reprocess PDF: {str(e)}")
+
+    return {"message": "PDF reprocessed successfully", "chunks": chunk_count}
 
 @app.get("/admin/queries/time")
-async def get_queries_over_time(current_user: User = Depends(get_current_user)):
+async def get_queries_over_time(
+    granularity: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    year: Optional[str] = None,
+    semester: Optional[str] = None,
+    subject: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # TODO: Implement query time series data
-    # This should return data in the format: [{"name": "date", "value": count}, ...]
-    return []
+    # Returns [{"name": <bucket start>, "value": count}, ...] from the pre-aggregated rollups
+    try:
+        return await get_query_series(granularity, start, end, year, semester, subject)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/stats")
+async def get_runtime_stats(current_user: User = Depends(get_current_admin)):
+    return {
+        "vectorstore_cache": vectorstore_cache.stats(),
+        "reranker": reranker.stats(),
+        "embedding_cache": embedding_model.stats(),
+        "answer_cache": answer_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "upload_extraction": extraction_jobs.stats(),
+        "image_cache": image_cache.stats(),
+    }
+
+class UpdateRoleRequest(BaseModel):
+    role: UserRole
+
+@app.put("/admin/users/{username}/role")
+async def update_user_role(username: str, update: UpdateRoleRequest, current_user: User = Depends(get_current_admin)):
+    result = await users_collection.update_one({"username": username}, {"$set": {"role": update.role.value}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Cached principals carry the old role; tokens issued with it must be re-checked
+    invalidate_user(username)
+    return {"message": "Role updated successfully", "username": username, "role": update.role.value}
 
 @app.get("/admin/users", response_model=List[UserResponse])
 async def get_all_users(current_user: User = Depends(get_current_admin)):
@@ -458,7 +673,7 @@ async def get_all_users(current_user: User = Depends(get_current_admin)):
         print(f"Fetching all users. Current user: {current_user.username}")  # Debug log
         
         # Get all users from the database
-        users = await users_collection.find({}).to_list(length=None)
+        users = await users_collection.find({}, {"chats": 0, "password": 0}).to_list(length=None)
         print(f"Found {len(users)} users in database")  # Debug log
         
         # Convert users to response model
@@ -1,33 +1,170 @@
-from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_mongodb import MongoDBChatMessageHistory
-from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import HumanMessage, AIMessage, message_to_dict, messages_from_dict
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, ASCENDING
+from datetime import datetime
+import asyncio
+import json
 import os
+import tiktoken
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MONGO_URL = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 DB_NAME = "ju_ece_chatbot"
-COLLECTION_NAME = "chat_memory"
+SESSION_COLLECTION_NAME = "chat_sessions"
+ARCHIVE_COLLECTION_NAME = "chat_memory"
 MAX_MESSAGES = 10
 
-def get_memory(username: str, session_id: str, year: str, semester: str, subject: str) -> ConversationBufferMemory:
-    combined_session_id = f"{username}_{year}_{semester}_{subject}_{session_id}"
-    history = MongoDBChatMessageHistory(
-        connection_string=MONGO_URL,
-        session_id=combined_session_id,
-        database_name=DB_NAME,
-        collection_name=COLLECTION_NAME
-    )
+# chat_sessions holds one document per session with only the last MAX_MESSAGES messages,
+# kept bounded server-side by $push + $slice, so reads and appends cost the same at any
+# history length. chat_memory (the old MongoDBChatMessageHistory collection, same layout)
+# is now an append-only archive of every message, for analytics.
+# load_history/aload_history return (message, token_count, joined_token_count) entries.
+client = MongoClient(MONGO_URL)
+session_collection = client[DB_NAME][SESSION_COLLECTION_NAME]
+archive_collection = client[DB_NAME][ARCHIVE_COLLECTION_NAME]
+
+async_client = AsyncIOMotorClient(MONGO_URL)
+async_session_collection = async_client[DB_NAME][SESSION_COLLECTION_NAME]
+async_archive_collection = async_client[DB_NAME][ARCHIVE_COLLECTION_NAME]
+
+_encoding = tiktoken.get_encoding("cl100k_base")
+
+def _session_key(username: str, session_id: str, year: str, semester: str, subject: str) -> str:
+    return f"{username}_{year}_{semester}_{subject}_{session_id}"
+
+async def ensure_memory_indexes():
+    await async_archive_collection.create_index([("SessionId", ASCENDING), ("_id", ASCENDING)])
+
+def _line(message) -> str:
+    return f"{message.type.upper()}: {message.content}"
+
+def _counts(message) -> dict:
+    # History lines always start with "HUMAN:"/"AI:", so cl100k never merges tokens across the
+    # "\n" that joins two lines: a joined suffix costs the sum of its lines' joined_token_count,
+    # except the last line, which costs its own token_count
+    line = _line(message)
+    return {
+        "token_count": len(_encoding.encode(line)),
+        "joined_token_count": len(_encoding.encode(line + "\n")),
+    }
+
+def _stored(message) -> dict:
+    # Token counts of the message's history line are computed once, when it is written
+    stored = message_to_dict(message)
+    stored.update(_counts(message))
+    return stored
+
+def _turn_messages(question: str, answer: str) -> list:
+    return [
+        _stored(HumanMessage(content=question)),
+        _stored(AIMessage(content=answer)),
+    ]
+
+def _missing_counts(stored_messages: list) -> bool:
+    return any("joined_token_count" not in stored for stored in stored_messages)
+
+def _with_counts(stored_messages: list) -> list:
+    # Messages written before counts were stored are counted once and written back
+    counted = []
+    for stored, message in zip(stored_messages, messages_from_dict(stored_messages)):
+        if "joined_token_count" not in stored:
+            stored = {**stored, **_counts(message)}
+        counted.append(stored)
+    return counted
+
+def _to_entries(stored_messages: list) -> list:
+    return [
+        (message, stored["token_count"], stored["joined_token_count"])
+        for stored, message in zip(stored_messages, messages_from_dict(stored_messages))
+    ]
+
+def history_to_str(entries: list) -> str:
+    return "\n".join(_line(entry[0]) for entry in entries)
+
+def trim_history(entries: list, max_tokens: int) -> list:
+    # Longest suffix whose joined text fits in max_tokens; arithmetic on the stored counts only
+    if not entries or entries[-1][1] > max_tokens:
+        return []
+    total = entries[-1][1]
+    start = len(entries) - 1
+    for i in range(len(entries) - 2, -1, -1):
+        total += entries[i][2]
+        if total > max_tokens:
+            break
+        start = i
+    return entries[start:]
+
+def _window_update(messages: list) -> dict:
+    return {
+        "$push": {"messages": {"$each": messages, "$slice": -MAX_MESSAGES}},
+        "$set": {"updated_at": datetime.utcnow()},
+    }
+
+def _archive_documents(key: str, messages: list) -> list:
+    return [{"SessionId": key, "History": json.dumps(message)} for message in messages]
+
+def _legacy_query(key: str):
+    return {"SessionId": key}, [("_id", -1)]
+
+def _seed_update(legacy_docs: list) -> dict:
+    # Sessions that predate chat_sessions: copy their window once from the archive
+    legacy_docs.reverse()
+    return {"$setOnInsert": {"messages": _with_counts([json.loads(doc["History"]) for doc in legacy_docs])}}
+
+def _backfill_query(key: str, stored_messages: list) -> dict:
+    # Only if the window is unchanged since it was read; a concurrent append wins
+    return {"_id": key, "messages": stored_messages}
+
+def load_history(username: str, session_id: str, year: str, semester: str, subject: str) -> list:
+    key = _session_key(username, session_id, year, semester, subject)
+    session = session_collection.find_one({"_id": key}, {"messages": 1})
+    if session is None:
+        query, sort = _legacy_query(key)
+        legacy_docs = list(archive_collection.find(query).sort(sort).limit(MAX_MESSAGES))
+        if not legacy_docs:
+            return []
+        seed = _seed_update(legacy_docs)
+        session_collection.update_one({"_id": key}, seed, upsert=True)
+        return _to_entries(seed["$setOnInsert"]["messages"])
+    messages = session.get("messages", [])
+    if _missing_counts(messages):
+        counted = _with_counts(messages)
+        session_collection.update_one(_backfill_query(key, messages), {"$set": {"messages": counted}})
+        messages = counted
+    return _to_entries(messages)
+
+def add_turn(username: str, session_id: str, year: str, semester: str, subject: str, question: str, answer: str) -> None:
+    key = _session_key(username, session_id, year, semester, subject)
+    messages = _turn_messages(question, answer)
+    session_collection.update_one({"_id": key}, _window_update(messages), upsert=True)
+    archive_collection.insert_many(_archive_documents(key, messages))
 
-    # Trim old messages
-    all_messages = history.messages
-    if len(all_messages) > MAX_MESSAGES:
-        history.messages = all_messages[-MAX_MESSAGES:]
+async def aload_history(username: str, session_id: str, year: str, semester: str, subject: str) -> list:
+    key = _session_key(username, session_id, year, semester, subject)
+    session = await async_session_collection.find_one({"_id": key}, {"messages": 1})
+    if session is None:
+        query, sort = _legacy_query(key)
+        legacy_docs = await async_archive_collection.find(query).sort(sort).limit(MAX_MESSAGES).to_list(length=MAX_MESSAGES)
+        if not legacy_docs:
+            return []
+        # Tokenizing legacy messages is CPU work; keep it off the event loop
+        seed = await asyncio.to_thread(_seed_update, legacy_docs)
+        await async_session_collection.update_one({"_id": key}, seed, upsert=True)
+        return _to_entries(seed["$setOnInsert"]["messages"])
+    messages = session.get("messages", [])
+    if _missing_counts(messages):
+        counted = await asyncio.to_thread(_with_counts, messages)
+        await async_session_collection.update_one(_backfill_query(key, messages), {"$set": {"messages": counted}})
+        messages = counted
+    return _to_entries(messages)
 
-    memory = ConversationBufferMemory(
-        chat_memory=history,
-        return_messages=True,
-        memory_key="history"
+async def aadd_turn(username: str, session_id: str, year: str, semester: str, subject: str, question: str, answer: str) -> None:
+    key = _session_key(username, session_id, year, semester, subject)
+    # A /multimodal_chat question carries the uploaded file's text; count it off the event loop
+    messages = await asyncio.to_thread(_turn_messages, question, answer)
+    await asyncio.gather(
+        async_session_collection.update_one({"_id": key}, _window_update(messages), upsert=True),
+        async_archive_collection.insert_many(_archive_documents(key, messages)),
     )
-    return memory
\ No newline at end of file
@@ -0,0 +1,46 @@
+import asyncio
+from pymongo.errors import BulkWriteError
+from database import users_collection, chats_collection
+from chat_log import ensure_chat_indexes
+from query_stats import rebuild
+
+# Moves every user's embedded "chats" array into the chat_logs collection.
+# Turns get deterministic ids (<user id>:<index>), so re-running after a crash
+# skips what was already copied instead of duplicating it.
+
+async def migrate_user(user):
+    chats = user.get("chats", [])
+    docs = []
+    for i, chat in enumerate(chats):
+        doc = dict(chat)
+        doc["_id"] = f"{user['_id']}:{i}"
+        doc["username"] = user["username"]
+        docs.append(doc)
+
+    if docs:
+        try:
+            await chats_collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # 11000 = already migrated by an earlier run
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+    await users_collection.update_one({"_id": user["_id"]}, {"$unset": {"chats": ""}})
+    return len(docs)
+
+async def migrate():
+    await ensure_chat_indexes()
+
+    users = 0
+    turns = 0
+    cursor = users_collection.find({"chats": {"$exists": True}}, {"username": 1, "chats": 1})
+    async for user in cursor:
+        turns += await migrate_user(user)
+        users += 1
+        print(f"Migrated {user['username']}")
+
+    print(f"Moved {turns} chat turns from {users} users into {chats_collection.name}")
+    await rebuild()
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,215 @@
+from langchain_core.documents import Document
+from dotenv import load_dotenv
+from pathlib import Path
+from threading import local
+import json
+import os
+import shutil
+import sqlite3
+import time
+import faiss
+import numpy as np
+
+load_dotenv()
+
+# index.faiss is the file FAISS.save_local already writes; only the pickled docstore is replaced
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite"
+SQLITE_MMAP_BYTES = 256 * 1024 * 1024
+
+# Readers open search/<generation>/{index.faiss, chunks.sqlite}; search.current names the
+# published generation. A generation is never modified after publishing, so a reader always
+# pairs an index with the chunks written alongside it.
+SNAPSHOT_DIR = "search"
+CURRENT_FILE = "search.current"
+# Superseded generations stay this long for requests still reading them (threads open
+# their SQLite connections lazily, so the files must outlive the swap)
+SNAPSHOT_GRACE_SECONDS = int(os.getenv("SNAPSHOT_GRACE_SECONDS", "600"))
+
+
+def has_chunk_store(persist_path) -> bool:
+    return (Path(persist_path) / CURRENT_FILE).exists()
+
+
+def _current_snapshot(persist_path) -> Path:
+    path = Path(persist_path)
+    generation = (path / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    return path / SNAPSHOT_DIR / generation
+
+
+def _write_chunks(vectorstore, path: Path):
+    rows = []
+    for position, doc_id in sorted(vectorstore.index_to_docstore_id.items()):
+        doc = vectorstore.docstore.search(doc_id)
+        rows.append((position, doc_id, doc.page_content, json.dumps(doc.metadata, default=str)))
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("CREATE TABLE chunks (pos INTEGER PRIMARY KEY, doc_id TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+        conn.execute("CREATE UNIQUE INDEX chunks_doc_id ON chunks (doc_id)")
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def save_chunk_store(vectorstore, persist_path):
+    """Publishes a new search generation: chunk text + metadata keyed by FAISS position,
+    next to the persisted index.faiss it was written with."""
+    path = Path(persist_path)
+    snapshots = path / SNAPSHOT_DIR
+    generation = f"{time.time_ns():020d}"
+    snapshot = snapshots / generation
+    snapshot.mkdir(parents=True)
+
+    _write_chunks(vectorstore, snapshot / CHUNKS_FILE)
+    try:
+        # index.faiss is only ever replaced, never rewritten in place, so a hard link is safe
+        os.link(path / INDEX_FILE, snapshot / INDEX_FILE)
+    except OSError:
+        shutil.copyfile(path / INDEX_FILE, snapshot / INDEX_FILE)
+
+    current = path / CURRENT_FILE
+    tmp_current = path / (CURRENT_FILE + ".tmp")
+    tmp_current.write_text(generation, encoding="utf-8")
+    # The swap is atomic; readers see either the old generation or the new one
+    os.replace(tmp_current, current)
+
+    _prune_snapshots(snapshots)
+
+
+def _prune_snapshots(snapshots: Path):
+    # Generation names are creation times, so each one was superseded when the next was written
+    generations = sorted(p.name for p in snapshots.iterdir() if p.is_dir())
+    now = time.time_ns()
+    for old, newer in zip(generations, generations[1:]):
+        if now - int(newer) > SNAPSHOT_GRACE_SECONDS * 1_000_000_000:
+            shutil.rmtree(snapshots / old, ignore_errors=True)
+
+
+class _ChunkDB:
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = local()
+
+    def conn(self) -> sqlite3.Connection:
+        # One read-only connection per thread; pages are mmapped so workers share the page cache
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+            self._local.conn = conn
+        return conn
+
+
+class _PositionIds:
+    """Read-only FAISS position -> docstore id mapping backed by SQLite."""
+
+    def __init__(self, db: _ChunkDB):
+        self._db = db
+
+    def __getitem__(self, position):
+        row = self._db.conn().execute("SELECT doc_id FROM chunks WHERE pos = ?", (int(position),)).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __len__(self):
+        return self._db.conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def items(self):
+        return self._db.conn().execute("SELECT pos, doc_id FROM chunks ORDER BY pos").fetchall()
+
+
+class _ChunkDocstore:
+    """Docstore lookalike: chunks are read only when a search hit asks for them."""
+
+    def __init__(self, db: _ChunkDB):
+        self._db = db
+
+    def search(self, doc_id):
+        row = self._db.conn().execute("SELECT text, metadata FROM chunks WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            # Same contract as InMemoryDocstore.search
+            return f"ID {doc_id} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def mget(self, doc_ids) -> dict:
+        if not doc_ids:
+            return {}
+        placeholders = ",".join("?" * len(doc_ids))
+        rows = self._db.conn().execute(
+            f"SELECT doc_id, text, metadata FROM chunks WHERE doc_id IN ({placeholders})", list(doc_ids)
+        ).fetchall()
+        return {doc_id: Document(page_content=text, metadata=json.loads(metadata)) for doc_id, text, metadata in rows}
+
+
+def _read_index(path: Path):
+    # IO_FLAG_MMAP only maps IVF inverted lists; flat codes and HNSW (vectors and links) are
+    # copied into every process. IO_FLAG_MMAP_IFC (faiss >= 1.11) maps all of them.
+    try:
+        return faiss.read_index(str(path), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(str(path))
+
+
+class MmapVectorStore:
+    """Read-only vectorstore over index.faiss + chunks.sqlite, with no pickle involved.
+
+    Exposes the parts of the LangChain FAISS store that retrieval uses
+    (``index``, ``index_to_docstore_id``, ``docstore.search``, ``_embed_query``).
+    """
+
+    _normalize_L2 = False
+
+    def __init__(self, index, db: _ChunkDB, embedding_function):
+        self.index = index
+        self.embedding_function = embedding_function
+        self.index_to_docstore_id = _PositionIds(db)
+        self.docstore = _ChunkDocstore(db)
+
+    @classmethod
+    def load(cls, persist_path, embeddings):
+        snapshot = _current_snapshot(persist_path)
+        return cls(_read_index(snapshot / INDEX_FILE), _ChunkDB(snapshot / CHUNKS_FILE), embeddings)
+
+    def _embed_query(self, text: str):
+        return self.embedding_function.embed_query(text)
+
+    def similarity_search_with_score(self, query: str, k: int = 4):
+        vector = np.asarray([self._embed_query(query)], dtype=np.float32)
+        distances, positions = self.index.search(vector, k)
+        hits = [(self.index_to_docstore_id[p], float(d)) for p, d in zip(positions[0], distances[0]) if p != -1]
+        docs = self.docstore.mget([doc_id for doc_id, _ in hits])
+        return [(docs[doc_id], score) for doc_id, score in hits if doc_id in docs]
+
+    def similarity_search(self, query: str, k: int = 4):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def get_by_ids(self, ids):
+        docs = self.docstore.mget(list(ids))
+        return [docs[doc_id] for doc_id in ids if doc_id in docs]
+
+
+def load_search_vectorstore(persist_path, embeddings, allow_pickle: bool):
+    """Opens the pickle-free store when present; falls back to FAISS.load_local only if allowed."""
+    if has_chunk_store(persist_path):
+        return MmapVectorStore.load(persist_path, embeddings)
+    if not allow_pickle:
+        raise ValueError(
+            f"{persist_path} has no {CHUNKS_FILE}; convert it with `python mmap_store.py {persist_path}`"
+        )
+    from langchain_community.vectorstores import FAISS
+    return FAISS.load_local(persist_path, embeddings=embeddings, allow_dangerous_deserialization=True)
+
+
+if __name__ == "__main__":
+    # Convert pickle-based stores in place (index.pkl is left for the ingestion tools)
+    import sys
+    from langchain_community.vectorstores import FAISS
+    from splitter_vectorstore import get_embeddings
+
+    for store_path in sys.argv[1:]:
+        store = FAISS.load_local(store_path, embeddings=get_embeddings(), allow_dangerous_deserialization=True)
+        save_chunk_store(store, store_path)
+        print(f"✅ {CHUNKS_FILE} written for {store_path}")
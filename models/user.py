@@ -10,7 +10,7 @@ class User(BaseModel):
     id: Optional[str] = None
     username: str
     email: EmailStr
-    password: str
+    password: Optional[str] = None
     role: UserRole = UserRole.USER
     mobile: Optional[str] = None
     location: Optional[str] = None
@@ -29,3 +29,9 @@ def extract_text_from_image(content: bytes):
     image = Image.open(io.BytesIO(content))
     return pytesseract.image_to_string(image).strip()
 
+# Utility: Text handed to the LLM for an uploaded file (runs in the upload extraction pool)
+def extract_upload_text(file_ext: str, content: bytes):
+    if file_ext == "pdf":
+        text, ocr_text = extract_text_and_images_from_pdf(content)
+        return f"{text}\n\n[Image Text]\n{ocr_text}"
+    return extract_text_from_image(content)
@@ -0,0 +1,168 @@
+# Kept free of Mongo/LangChain imports: spawned OCR workers import only this module
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dotenv import load_dotenv
+import hashlib
+import json
+import multiprocessing
+import os
+# OCR dependencies
+from pdf2image import convert_from_path, pdfinfo_from_path
+import pytesseract
+
+# Optional: manually set Tesseract path if not in PATH
+# pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+load_dotenv()
+
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# Pages submitted but not yet collected; bounds rasterized pages held at once
+OCR_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", str(2 * OCR_WORKERS)))
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "120"))
+# Resumable progress lives here, never next to the source PDFs in ./data
+OCR_PROGRESS_DIR = os.getenv("OCR_PROGRESS_DIR", "ocr_progress")
+PROGRESS_SUFFIX = ".ocr.jsonl"
+
+_worker_budget = OCR_WORKERS
+
+
+def set_worker_budget(workers: int):
+    """Caps OCR processes per PDF; callers that already run inside a process pool set 1."""
+    global _worker_budget
+    _worker_budget = max(1, workers)
+
+
+def is_progress_file(filename: str) -> bool:
+    # Older runs wrote <pdf>.ocr.jsonl beside the PDF; listings skip any that are left over
+    return filename.endswith(PROGRESS_SUFFIX)
+
+
+def _ocr_page(pdf_path, page_number, dpi, timeout):
+    # Rasterize a single page so memory stays at one bitmap per worker
+    images = convert_from_path(
+        pdf_path, dpi=dpi, first_page=page_number, last_page=page_number,
+        grayscale=True, thread_count=1, timeout=timeout,
+    )
+    if not images:
+        return page_number, ""
+    return page_number, pytesseract.image_to_string(images[0], timeout=timeout).strip()
+
+
+def _progress_path(pdf_path):
+    key = hashlib.sha1(os.path.abspath(pdf_path).encode()).hexdigest()[:16]
+    return os.path.join(OCR_PROGRESS_DIR, f"{os.path.basename(pdf_path)}.{key}{PROGRESS_SUFFIX}")
+
+
+def discard_progress(pdf_path):
+    try:
+        os.remove(_progress_path(pdf_path))
+    except FileNotFoundError:
+        pass
+
+
+def _source_signature(pdf_path, dpi):
+    stat = os.stat(pdf_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "dpi": dpi}
+
+
+def _load_progress(path, signature) -> dict:
+    if not os.path.exists(path):
+        return {}
+    done = {}
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A crash mid-write leaves a partial line; skip it and keep the rest
+                continue
+            if number == 0:
+                if entry != signature:
+                    # The PDF or DPI changed since the interrupted run; start over
+                    return {}
+            elif isinstance(entry, dict) and "page" in entry:
+                done[entry["page"]] = entry["text"]
+    return done
+
+
+def _pages_inline(pdf_path, pages, dpi, page_timeout):
+    for page in pages:
+        try:
+            yield page, _ocr_page(pdf_path, page, dpi, page_timeout)[1], None
+        except Exception as e:
+            yield page, None, e
+
+
+def _pages_in_pool(pdf_path, pages, dpi, page_timeout, workers, max_in_flight):
+    # spawn: callers may hold Mongo clients and torch state that must not be forked
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        queued = iter(pages)
+        in_flight = {}
+
+        def submit_next():
+            page = next(queued, None)
+            if page is not None:
+                in_flight[pool.submit(_ocr_page, pdf_path, page, dpi, page_timeout)] = page
+
+        for _ in range(max(1, max_in_flight)):
+            submit_next()
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                page = in_flight.pop(future)
+                try:
+                    yield page, future.result()[1], None
+                except Exception as e:
+                    yield page, None, e
+                submit_next()
+
+
+def ocr_pdf(pdf_path, dpi=OCR_DPI, workers=None, max_in_flight=OCR_MAX_IN_FLIGHT,
+            page_timeout=OCR_PAGE_TIMEOUT) -> list:
+    """OCRs every page of `pdf_path`, page by page; returns page texts in order.
+
+    Pages are spread over up to ``workers`` processes (default: the budget set with
+    :func:`set_worker_budget`, else OCR_WORKERS); with a budget of 1 they run in this process.
+    Finished pages are recorded under OCR_PROGRESS_DIR so an interrupted run resumes where it
+    stopped. Pages that fail or time out come back as "" and are retried on the next run; the
+    progress file is removed once every page succeeded.
+    """
+    workers = _worker_budget if workers is None else workers
+    page_count = pdfinfo_from_path(pdf_path, timeout=page_timeout)["Pages"]
+    signature = _source_signature(pdf_path, dpi)
+    progress_path = _progress_path(pdf_path)
+    done = _load_progress(progress_path, signature)
+    pending = [p for p in range(1, page_count + 1) if p not in done]
+    if done:
+        print(f"↩️ Resuming OCR of {os.path.basename(pdf_path)}: {len(done)}/{page_count} pages done")
+
+    failed = 0
+    os.makedirs(OCR_PROGRESS_DIR, exist_ok=True)
+    # Rewritten from what parsed, so a torn line from a crash never precedes new records.
+    # The rewrite goes through a temp file so a crash during it keeps the previous progress.
+    with open(progress_path + ".tmp", "w", encoding="utf-8") as progress:
+        progress.write(json.dumps(signature) + "\n")
+        for page, text in sorted(done.items()):
+            progress.write(json.dumps({"page": page, "text": text}) + "\n")
+    os.replace(progress_path + ".tmp", progress_path)
+
+    with open(progress_path, "a", encoding="utf-8") as progress:
+        if pending:
+            if workers <= 1:
+                results = _pages_inline(pdf_path, pending, dpi, page_timeout)
+            else:
+                results = _pages_in_pool(pdf_path, pending, dpi, page_timeout,
+                                         min(workers, len(pending)), max_in_flight)
+            for page, text, error in results:
+                if error is not None:
+                    failed += 1
+                    print(f"❌ OCR failed for page {page} of {pdf_path}: {error}")
+                    continue
+                done[page] = text
+                progress.write(json.dumps({"page": page, "text": text}) + "\n")
+                progress.flush()
+
+    if not failed:
+        os.remove(progress_path)
+    return [done.get(page, "") for page in range(1, page_count + 1)]
@@ -0,0 +1,129 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from dotenv import load_dotenv
+import asyncio
+import os
+import time
+
+load_dotenv()
+
+# argon2/bcrypt release the GIL, so a few threads hash in parallel without touching the event loop
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Beyond this many queued + running hashes, new logins are refused instead of waiting
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "64"))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "2"))
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing queue is full; handlers answer 503 with Retry-After."""
+
+    def __init__(self, retry_after: int = HASH_RETRY_AFTER):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs a passlib CryptContext on a bounded thread pool.
+
+    ``hash``/``verify`` await the pool; once ``max_pending`` calls are queued or running,
+    further calls fail fast with :class:`HashingOverloaded`. ``rehash_in_background`` upgrades
+    deprecated hashes after a successful login without delaying the response.
+    """
+
+    def __init__(self, context, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+        self._lock = Lock()
+        self._pending = 0
+        self._background = set()
+        self._queue_waits_ms = deque(maxlen=1024)
+        self._durations_ms = deque(maxlen=1024)
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.rehash_failures = 0
+
+    def _timed(self, fn, enqueued_at: float, *args):
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._queue_waits_ms.append((started - enqueued_at) * 1000)
+                self._durations_ms.append((finished - started) * 1000)
+                self.completed += 1
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingOverloaded()
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, fn, time.monotonic(), *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    def needs_update(self, hashed: str) -> bool:
+        # Only inspects the hash prefix/parameters; cheap enough for the event loop
+        return self.context.needs_update(hashed)
+
+    def rehash_in_background(self, password: str, save):
+        """Hashes `password` with the current default scheme and awaits ``save(new_hash)``."""
+        async def _rehash():
+            try:
+                await save(await self.hash(password))
+                with self._lock:
+                    self.rehashed += 1
+            except Exception as e:
+                # Overload or DB errors just postpone the upgrade to the next login
+                with self._lock:
+                    self.rehash_failures += 1
+                print(f"⚠️ Background rehash failed: {e}")
+
+        task = asyncio.create_task(_rehash())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = list(self._queue_waits_ms)
+            durations = list(self._durations_ms)
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "rehash_failures": self.rehash_failures,
+                "queue_wait_ms": {
+                    "p50": _percentile(waits, 50),
+                    "p95": _percentile(waits, 95),
+                    "max": max(waits, default=0.0),
+                },
+                "hash_ms": {
+                    "p50": _percentile(durations, 50),
+                    "p95": _percentile(durations, 95),
+                    "max": max(durations, default=0.0),
+                },
+            }
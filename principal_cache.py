@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from threading import Lock
+from dotenv import load_dotenv
+import os
+import time
+
+load_dotenv()
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+
+class PrincipalCache:
+    """Verified users keyed by access token, so authenticated requests skip the users lookup.
+
+    An entry lives for the TTL or until its token expires, whichever is sooner. Profile and
+    role changes drop a user's entries; logged-out tokens are refused until they expire.
+    """
+
+    def __init__(self, ttl_seconds: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (user, expires_at)
+        self._tokens_by_user = {}  # username -> set of cached tokens
+        self._revoked = {}  # token -> token expiry (epoch seconds); local copy of revoked_tokens
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(token)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user, token_expires_at=None):
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, float(token_expires_at))
+        with self._lock:
+            if token in self._revoked:
+                return
+            self._drop(token)
+            self._entries[token] = (user, expires_at)
+            self._tokens_by_user.setdefault(user.username, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[0].username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[0].username]
+
+    def invalidate_user(self, username: str):
+        with self._lock:
+            tokens = list(self._tokens_by_user.get(username, ()))
+            for token in tokens:
+                self._drop(token)
+            if tokens:
+                self.invalidations += 1
+
+    def revoke(self, token: str, token_expires_at: float):
+        now = time.time()
+        with self._lock:
+            self._drop(token)
+            self._revoked = {t: exp for t, exp in self._revoked.items() if exp > now}
+            self._revoked[token] = float(token_expires_at)
+
+    def is_revoked(self, token: str) -> bool:
+        with self._lock:
+            expires_at = self._revoked.get(token)
+            return expires_at is not None and expires_at > time.time()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "revoked_tokens": len(self._revoked),
+            }
+
+
+principal_cache = PrincipalCache()
@@ -61,3 +61,9 @@ def optimize_query(raw_query, chat_history_str):
         "query": raw_query,
         "chat_history": chat_history_str
     })
+
+async def aoptimize_query(raw_query, chat_history_str):
+    return await optimize_query_chain.ainvoke({
+        "query": raw_query,
+        "chat_history": chat_history_str
+    })
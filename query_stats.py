@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from database import db, chats_collection
+
+# Counters maintained on every chat write, so the admin dashboard reads a handful of small
+# documents instead of scanning chat history.
+stats_collection = db["query_stats"]  # {"_id": "totals", "queries": int}
+query_counts_collection = db["query_counts"]  # {"_id": <normalized question>, "count": int}
+# {"_id": "<granularity>|<bucket>|<year>|<semester>|<subject>", "granularity", "bucket", "year", "semester", "subject", "count"}
+rollups_collection = db["query_rollups"]
+
+GRANULARITY_STEPS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+DEFAULT_RANGES = {
+    "minute": timedelta(hours=2),
+    "hour": timedelta(days=2),
+    "day": timedelta(days=30),
+}
+MAX_SERIES_BUCKETS = 5000
+
+def normalize_question(question: str) -> str:
+    return question.strip().lower()
+
+async def ensure_stats_indexes():
+    await query_counts_collection.create_index([("count", DESCENDING)])
+    await chats_collection.create_index([("timestamp", DESCENDING)])
+    await rollups_collection.create_index([("granularity", ASCENDING), ("bucket", ASCENDING)])
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _naive_utc(ts: datetime | None) -> datetime | None:
+    # Chat timestamps are stored as naive UTC
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def _rollup_id(granularity: str, bucket: datetime, year, semester, subject) -> str:
+    # Must match the string built by rebuild_rollups' aggregation
+    return f"{granularity}|{bucket.strftime('%Y-%m-%dT%H:%M:%S')}|{year or ''}|{semester or ''}|{subject or ''}"
+
+def _rollup_updates(entry: dict) -> list:
+    ts = entry.get("timestamp")
+    if not ts:
+        return []
+    year, semester, subject = entry.get("year"), entry.get("semester"), entry.get("subject")
+    updates = []
+    for granularity in GRANULARITY_STEPS:
+        bucket = bucket_start(ts, granularity)
+        updates.append(UpdateOne(
+            {"_id": _rollup_id(granularity, bucket, year, semester, subject)},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {
+                    "granularity": granularity,
+                    "bucket": bucket,
+                    "year": year or "",
+                    "semester": semester or "",
+                    "subject": subject or "",
+                },
+            },
+            upsert=True,
+        ))
+    return updates
+
+async def record_query(entry: dict):
+    question = normalize_question(entry.get("question") or "")
+    updates = [stats_collection.update_one({"_id": "totals"}, {"$inc": {"queries": 1}}, upsert=True)]
+    if question:
+        updates.append(query_counts_collection.update_one({"_id": question}, {"$inc": {"count": 1}}, upsert=True))
+    rollup_updates = _rollup_updates(entry)
+    if rollup_updates:
+        updates.append(rollups_collection.bulk_write(rollup_updates, ordered=False))
+    await asyncio.gather(*updates)
+
+async def get_total_queries() -> int:
+    totals = await stats_collection.find_one({"_id": "totals"})
+    return totals.get("queries", 0) if totals else 0
+
+async def get_top_queries(limit: int = 5) -> list:
+    cursor = query_counts_collection.find({}).sort("count", DESCENDING).limit(limit)
+    return [{"query": doc["_id"], "count": doc["count"]} async for doc in cursor]
+
+async def get_recent_activity(limit: int = 10) -> list:
+    cursor = chats_collection.find(
+        {"timestamp": {"$ne": None}}, {"question": 1, "timestamp": 1, "username": 1}
+    ).sort("timestamp", DESCENDING).limit(limit)
+    return [
+        {
+            "query": chat.get("question", ""),
+            "timestamp": chat["timestamp"].isoformat() if chat.get("timestamp") else "",
+            "username": chat.get("username", "")
+        }
+        async for chat in cursor
+    ]
+
+async def get_query_series(granularity: str, start: datetime | None = None, end: datetime | None = None,
+                           year: str | None = None, semester: str | None = None, subject: str | None = None) -> list:
+    # Reads only the rollup documents in range; cost is bounded by the number of buckets
+    if granularity not in GRANULARITY_STEPS:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    step = GRANULARITY_STEPS[granularity]
+    start, end = _naive_utc(start), _naive_utc(end)
+    end = end or datetime.utcnow()
+    start = bucket_start(start or end - DEFAULT_RANGES[granularity], granularity)
+    if start >= end:
+        return []
+    if (end - start) / step > MAX_SERIES_BUCKETS:
+        raise ValueError(f"Range too large for {granularity} granularity (max {MAX_SERIES_BUCKETS} buckets)")
+
+    match = {"granularity": granularity, "bucket": {"$gte": start, "$lt": end}}
+    for field, value in (("year", year), ("semester", semester), ("subject", subject)):
+        if value:
+            match[field] = value
+
+    counts = {}
+    async for row in rollups_collection.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$bucket", "count": {"$sum": "$count"}}},
+    ]):
+        counts[row["_id"]] = row["count"]
+
+    series = []
+    bucket = start
+    while bucket < end:
+        series.append({"name": bucket.isoformat(), "value": counts.get(bucket, 0)})
+        bucket += step
+    return series
+
+async def rebuild_rollups():
+    # Batch backfill of every granularity from raw chat history
+    await rollups_collection.delete_many({})
+    for granularity in GRANULARITY_STEPS:
+        await chats_collection.aggregate([
+            {"$match": {"timestamp": {"$type": "date"}}},
+            {"$group": {
+                "_id": {
+                    "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": granularity}},
+                    "year": {"$ifNull": [{"$toString": "$year"}, ""]},
+                    "semester": {"$ifNull": [{"$toString": "$semester"}, ""]},
+                    "subject": {"$ifNull": [{"$toString": "$subject"}, ""]},
+                },
+                "count": {"$sum": 1},
+            }},
+            {"$project": {
+                "_id": {"$concat": [
+                    granularity, "|",
+                    {"$dateToString": {"date": "$_id.bucket", "format": "%Y-%m-%dT%H:%M:%S"}}, "|",
+                    "$_id.year", "|", "$_id.semester", "|", "$_id.subject",
+                ]},
+                "granularity": granularity,
+                "bucket": "$_id.bucket",
+                "year": "$_id.year",
+                "semester": "$_id.semester",
+                "subject": "$_id.subject",
+                "count": 1,
+            }},
+            {"$merge": {"into": rollups_collection.name, "whenMatched": "replace"}},
+        ]).to_list(length=None)
+    print(f"Rebuilt query rollups: {await rollups_collection.count_documents({})} buckets")
+
+async def rebuild_counters():
+    # Recompute every counter from chat_logs (after a migration or if counters drift)
+    total = await chats_collection.count_documents({})
+    await stats_collection.replace_one({"_id": "totals"}, {"queries": total}, upsert=True)
+
+    await query_counts_collection.delete_many({})
+    await chats_collection.aggregate([
+        {"$match": {"question": {"$type": "string", "$ne": ""}}},
+        {"$group": {"_id": {"$toLower": {"$trim": {"input": "$question"}}}, "count": {"$sum": 1}}},
+        {"$merge": {"into": query_counts_collection.name, "whenMatched": "replace"}},
+    ]).to_list(length=None)
+    print(f"Rebuilt query counters from {total} chat turns")
+
+async def rebuild(counters: bool = True, rollups: bool = True):
+    if counters:
+        await rebuild_counters()
+    if rollups:
+        await rebuild_rollups()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild dashboard counters and query rollups from chat_logs")
+    parser.add_argument("--counters-only", action="store_true")
+    parser.add_argument("--rollups-only", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(rebuild(counters=not args.rollups_only, rollups=not args.counters_only))
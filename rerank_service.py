@@ -0,0 +1,146 @@
+from collections import deque
+from concurrent.futures import Future
+from dotenv import load_dotenv
+import asyncio
+import os
+import queue
+import threading
+import time
+
+load_dotenv()
+
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+RERANK_MAX_BATCH = int(os.getenv("RERANK_MAX_BATCH", "64"))
+
+
+class _Request:
+    __slots__ = ("pairs", "future", "enqueued_at")
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class RerankService:
+    """Collects (query, passage) pairs from concurrent callers into one CrossEncoder forward pass.
+
+    Drop-in for ``CrossEncoder.predict``: ``predict(pairs)`` blocks until this caller's scores are
+    ready, ``apredict(pairs)`` awaits them. A batch closes once it holds ``max_batch_pairs`` pairs
+    or ``max_wait_ms`` after its oldest request arrived, whichever comes first.
+    """
+
+    def __init__(self, model, max_wait_ms: float = RERANK_MAX_WAIT_MS, max_batch_pairs: int = RERANK_MAX_BATCH, history: int = 1024):
+        self.model = model
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_pairs = max_batch_pairs
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=history)
+        self._queue_waits_ms = deque(maxlen=history)
+        self.batches = 0
+        self.requests = 0
+        self.pairs = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, pairs) -> Future:
+        request = _Request(list(pairs))
+        if not request.pairs:
+            request.future.set_result([])
+            return request.future
+        self._ensure_started()
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, pairs):
+        return self.submit(pairs).result()
+
+    async def apredict(self, pairs):
+        return await asyncio.wrap_future(self.submit(pairs))
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        size = len(first.pairs)
+        deadline = first.enqueued_at + self.max_wait
+        while size < self.max_batch_pairs:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    request = self._queue.get(timeout=timeout)
+                else:
+                    # Past the deadline (e.g. the previous batch ran long): still take whatever
+                    # is already queued, so a backlog drains in full batches
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.pairs)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [r for r in self._collect() if r.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            all_pairs = [pair for r in batch for pair in r.pairs]
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.pairs += len(all_pairs)
+                self._batch_sizes.append(len(all_pairs))
+                self._queue_waits_ms.extend((started - r.enqueued_at) * 1000 for r in batch)
+
+            try:
+                scores = self.model.predict(all_pairs, batch_size=max(len(all_pairs), 1))
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+
+            offset = 0
+            for r in batch:
+                r.future.set_result(scores[offset:offset + len(r.pairs)])
+                offset += len(r.pairs)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = list(self._queue_waits_ms)
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "pairs": self.pairs,
+                "queued": self._queue.qsize(),
+                "max_wait_ms": self.max_wait * 1000,
+                "max_batch_pairs": self.max_batch_pairs,
+                "batch_size": {
+                    "avg": sum(sizes) / len(sizes) if sizes else 0.0,
+                    "p50": _percentile(sizes, 50),
+                    "p95": _percentile(sizes, 95),
+                    "max": max(sizes, default=0),
+                },
+                "queue_wait_ms": {
+                    "avg": sum(waits) / len(waits) if waits else 0.0,
+                    "p50": _percentile(waits, 50),
+                    "p95": _percentile(waits, 95),
+                    "max": max(waits, default=0.0),
+                },
+            }
@@ -11,6 +11,8 @@ class Settings(BaseSettings):
     detailed_max_output_tokens: int = 600
     k_initial: int = 10
     top_after_rerank: int = 5
+    hybrid_fusion: str = "rrf"  # "rrf", "linear" or "dense"
+    hybrid_alpha: float = 0.5  # dense weight when hybrid_fusion == "linear"
     vectorstores_base: str = "vectorstores"
     allow_dangerous_deser: bool = False
 
@@ -5,6 +5,7 @@ from pymongo.server_api import ServerApi
 from contextlib import asynccontextmanager
 from utils.logging import log
 from passlib.context import CryptContext
+from utils.hashing import PasswordHasher
 import sys
 
 load_dotenv(find_dotenv())
@@ -12,6 +13,8 @@ load_dotenv(find_dotenv())
 client = None
 
 pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
+# Hashing runs on its own bounded pool; see utils/hashing.py
+password_hasher = PasswordHasher(pwd_context)
 
 async def connect_db():
     uri = os.getenv("MONGO_URI")
@@ -1,5 +1,7 @@
 from db.connection import lifespan
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from utils.hashing import HashingOverloaded
 from fastapi.middleware.cors import CORSMiddleware
 from routers import auth_routes
 
@@ -22,6 +24,14 @@ app.add_middleware(
 
 app.include_router(auth_routes.router)
 
+@app.exception_handler(HashingOverloaded)
+async def hashing_overloaded(request: Request, exc: HashingOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.get("/")
 def home():
     print("Hello bhai")
\ No newline at end of file
@@ -1,5 +1,5 @@
-from ..memory.memory_service import get_chat_history, append_user_message, append_ai_message
-from ..retrieval.vectorstore_loader import load_vectorstore
+from ..memory.memory_service import get_chat_history, append_turn
+from ..retrieval.vectorstore_loader import load_search_indexes
 from ..retrieval.retriever import retrieve
 from ..retrieval.reranker import rerank
 from ..pipeline.query_optimizer import optimize_query
@@ -12,19 +12,17 @@ def get_chat_response(username: str, question: str, session_id: str, year: str,
 
     optimized_query = optimize_query(question, chat_history_str)
 
-    vectorstore = load_vectorstore(subject, semester, year, embedding_model)
-    initial_docs = retrieve(vectorstore, optimized_query, k=settings.k_initial)
+    vectorstore, sparse_index = load_search_indexes(subject, semester, year, embedding_model)
+    initial_docs = retrieve(vectorstore, optimized_query, k=settings.k_initial, sparse_index=sparse_index)
     if not initial_docs:
-        append_user_message(username, session_id, year, semester, subject, question)
-        append_ai_message(username, session_id, year, semester, subject, "I don't know based on the given context.")
+        append_turn(username, session_id, year, semester, subject, question, "I don't know based on the given context.")
         return {"answer": "I don't know based on the given context.", "images": []}
 
     top_docs = rerank(cross_encoder, optimized_query, initial_docs, settings.top_after_rerank)
 
     response = build_and_run_fn(chat_history_str, top_docs, optimized_query)
 
-    append_user_message(username, session_id, year, semester, subject, question)
-    append_ai_message(username, session_id, year, semester, subject, response)
+    append_turn(username, session_id, year, semester, subject, question, response)
 
     try:
         doc_filename = top_docs[0].metadata.get("source", "")
@@ -1,2 +1,6 @@
-def retrieve(vectorstore, query: str, k: int):
-    return vectorstore.similarity_search(query, k=k)
+from sparse_index import hybrid_search
+from ..config.settings import settings
+
+def retrieve(vectorstore, query: str, k: int, sparse_index=None):
+    # Dense FAISS hits fused with BM25 hits; dense-only when the store has no sparse index
+    return hybrid_search(vectorstore, sparse_index, query, k, fusion=settings.hybrid_fusion, alpha=settings.hybrid_alpha)
@@ -1,14 +1,20 @@
 from pathlib import Path
-from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from sparse_index import BM25Index
+from index_spec import apply_index_spec
+from mmap_store import load_search_vectorstore
+from vectorstore_cache import vectorstore_cache
 from ..config.settings import settings
 
-def load_vectorstore(subject: str, semester: str, year: str, embedding_model: HuggingFaceEmbeddings):
+def load_search_indexes(subject: str, semester: str, year: str, embedding_model: HuggingFaceEmbeddings):
+    # (dense store, BM25 index or None), cached together per subject
     path = Path(settings.vectorstores_base) / f"{subject}_{year}_{semester}"
     if not path.exists():
         raise FileNotFoundError(f"Vectorstore not found: {path}")
-    return FAISS.load_local(
-        path,
-        embeddings=embedding_model,
-        allow_dangerous_deserialization=settings.allow_dangerous_deser,
-    )
+
+    def _load(p):
+        # chunks.sqlite stores need no unpickling; legacy stores still require the opt-in
+        vectorstore = load_search_vectorstore(p, embedding_model, allow_pickle=settings.allow_dangerous_deser)
+        return apply_index_spec(vectorstore, p), BM25Index.load(p)
+
+    return vectorstore_cache.get((subject, year, semester), path, _load)
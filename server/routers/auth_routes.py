@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Response
 from models.user import User, UserCreate, UserLogin, UserRole
-from db.connection import client, get_users_collection, pwd_context
+from db.connection import client, get_users_collection, password_hasher
 from datetime import datetime
 from utils.logging import log
 from utils.security import getAccessAndRefreshTokens
@@ -20,7 +20,7 @@ async def register(user: UserCreate, users_collection=Depends(get_users_collecti
     if existing_user:
         raise HTTPException(status_code=409, detail="Username already exists")
 
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     
     now = datetime.now()
 
@@ -48,8 +48,14 @@ async def login(user: UserLogin, response: Response, users_collection=Depends(ge
     if not existing_user:
         raise HTTPException(status_code=401, detail="Unauthorized access")
     
-    if not pwd_context.verify(user.password, existing_user["password"]):
+    if not await password_hasher.verify(user.password, existing_user["password"]):
         raise HTTPException(status_code=401, detail="Unauthorized access")
+
+    # bcrypt hashes are deprecated under the argon2-first context; upgrade without delaying the login
+    if password_hasher.needs_update(existing_user["password"]):
+        async def _save_hash(new_hash):
+            await users_collection.update_one({"_id": existing_user["_id"]}, {"$set": {"password": new_hash}})
+        password_hasher.rehash_in_background(user.password, _save_hash)
     
     tokens = getAccessAndRefreshTokens(existing_user)
     
@@ -7,7 +7,9 @@ def count_tokens(text: str) -> int:
 def pack_context(docs, max_tokens: int) -> str:
     out, total = [], 0
     for d in docs:
-        n = count_tokens(d.page_content)
+        n = d.metadata.get("token_count")
+        if n is None:  # index built before token counts were stored
+            n = count_tokens(d.page_content)
         if total + n > max_tokens: break
         out.append(d.page_content)
         total += n
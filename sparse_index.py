@@ -0,0 +1,280 @@
+from collections import Counter, defaultdict
+from dotenv import load_dotenv
+import json
+import math
+import os
+import re
+import numpy as np
+
+load_dotenv()
+
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")  # "rrf", "linear" or "dense"
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))  # dense weight for "linear"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "30"))  # per retriever, before fusion
+RRF_K = 60
+
+META_FILE = "bm25_meta.json"
+POSTINGS_DOCS_FILE = "bm25_postings_docs.npy"
+POSTINGS_TF_FILE = "bm25_postings_tf.npy"
+DOC_LEN_FILE = "bm25_doc_len.npy"
+
+# \w keeps part numbers ("8085"), acronyms ("kvl") and Greek/unit symbols ("ω", "µ") as terms
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a vectorstore's chunks, stored as flat postings arrays.
+
+    Postings for term t are ``postings_docs[start:end]`` / ``postings_tf[start:end]`` where
+    ``vocab[t] = [start, end, idf]``; positions index into ``doc_ids`` (the docstore ids).
+    Arrays are memory-mapped on load, so opening an index costs little beyond the vocab.
+    """
+
+    def __init__(self, doc_ids, vocab, postings_docs, postings_tf, doc_len, k1=1.5, b=0.75):
+        self.doc_ids = doc_ids
+        self.vocab = vocab
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.avgdl = float(np.mean(doc_len)) if len(doc_len) else 0.0
+
+    @staticmethod
+    def _idf(n_docs: int, df: int) -> float:
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def build(cls, doc_ids, texts, k1=1.5, b=0.75):
+        postings = defaultdict(list)
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[position] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((position, tf))
+
+        n_docs = len(texts)
+        vocab = {}
+        docs_parts, tf_parts = [], []
+        offset = 0
+        for term in sorted(postings):
+            entries = postings[term]
+            df = len(entries)
+            vocab[term] = [offset, offset + df, cls._idf(n_docs, df)]
+            docs_parts.extend(position for position, _ in entries)
+            tf_parts.extend(tf for _, tf in entries)
+            offset += df
+
+        return cls(
+            list(doc_ids),
+            vocab,
+            np.asarray(docs_parts, dtype=np.int32),
+            np.asarray(tf_parts, dtype=np.float32),
+            doc_len,
+            k1=k1,
+            b=b,
+        )
+
+    def updated(self, removed_ids=(), added_ids=(), added_texts=()):
+        """New index without `removed_ids` and with (added_ids, added_texts) appended.
+
+        Existing postings are filtered and renumbered as arrays; only the added texts are
+        tokenized, so an incremental ingest costs O(postings) rather than re-reading the subject.
+        """
+        removed = set(removed_ids)
+        keep = np.fromiter((doc_id not in removed for doc_id in self.doc_ids), dtype=bool, count=len(self.doc_ids))
+        renumber = np.cumsum(keep) - 1
+        n_kept = int(keep.sum())
+
+        terms = sorted(self.vocab, key=lambda t: self.vocab[t][0])
+        spans = np.asarray([self.vocab[t][:2] for t in terms], dtype=np.int64).reshape(-1, 2)
+        old_docs = np.asarray(self.postings_docs)
+        old_terms = np.repeat(np.arange(len(terms)), spans[:, 1] - spans[:, 0])
+        alive = keep[old_docs] if len(old_docs) else np.zeros(0, dtype=bool)
+
+        term_index = {term: i for i, term in enumerate(terms)}
+        new_terms, new_docs, new_tf = [], [], []
+        doc_len = list(np.asarray(self.doc_len)[keep])
+        for offset, text in enumerate(added_texts):
+            counts = Counter(tokenize(text))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                if term not in term_index:
+                    term_index[term] = len(terms)
+                    terms.append(term)
+                new_terms.append(term_index[term])
+                new_docs.append(n_kept + offset)
+                new_tf.append(tf)
+
+        all_terms = np.concatenate([old_terms[alive], np.asarray(new_terms, dtype=np.int64)])
+        all_docs = np.concatenate([renumber[old_docs[alive]], np.asarray(new_docs, dtype=np.int64)])
+        all_tf = np.concatenate([np.asarray(self.postings_tf)[alive], np.asarray(new_tf, dtype=np.float32)])
+
+        # Lay postings out again in sorted-term order, documents ascending within a term
+        sorted_terms = sorted(terms)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[term_index[t] for t in sorted_terms]] = np.arange(len(sorted_terms))
+        keys = rank[all_terms]
+        order = np.lexsort((all_docs, keys))
+        df = np.bincount(keys, minlength=len(sorted_terms))
+        offsets = np.concatenate([[0], np.cumsum(df)])
+
+        n_docs = len(doc_len)
+        vocab = {
+            term: [int(offsets[i]), int(offsets[i + 1]), self._idf(n_docs, int(df[i]))]
+            for i, term in enumerate(sorted_terms) if df[i]
+        }
+        doc_ids = [doc_id for doc_id, kept in zip(self.doc_ids, keep) if kept] + list(added_ids)
+        return BM25Index(
+            doc_ids,
+            vocab,
+            all_docs[order].astype(np.int32),
+            all_tf[order].astype(np.float32),
+            np.asarray(doc_len, dtype=np.float32),
+            k1=self.k1,
+            b=self.b,
+        )
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        # Aligned with the FAISS positions' docstore ids so hits can be fused by id
+        doc_ids = [vectorstore.index_to_docstore_id[i] for i in range(len(vectorstore.index_to_docstore_id))]
+        texts = [vectorstore.docstore.search(doc_id).page_content for doc_id in doc_ids]
+        return cls.build(doc_ids, texts)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        # Write-then-rename: loaded indexes keep mmapping the old files instead of seeing them truncated
+        for name, array in ((POSTINGS_DOCS_FILE, self.postings_docs), (POSTINGS_TF_FILE, self.postings_tf),
+                            (DOC_LEN_FILE, self.doc_len)):
+            target = os.path.join(path, name)
+            with open(target + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(target + ".tmp", target)
+        meta_path = os.path.join(path, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "doc_ids": self.doc_ids, "vocab": self.vocab}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, path):
+        # Returns None for stores built before sparse indexes existed
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            meta["doc_ids"],
+            meta["vocab"],
+            np.load(os.path.join(path, POSTINGS_DOCS_FILE), mmap_mode="r"),
+            np.load(os.path.join(path, POSTINGS_TF_FILE), mmap_mode="r"),
+            np.load(os.path.join(path, DOC_LEN_FILE), mmap_mode="r"),
+            k1=meta["k1"],
+            b=meta["b"],
+        )
+
+    def search(self, query: str, k: int) -> list:
+        # [(doc_id, score)] best first, only documents sharing at least one term
+        n_docs = len(self.doc_ids)
+        if not n_docs or k <= 0:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            start, end, idf = entry
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def build_sparse_index(vectorstore, persist_path):
+    index = BM25Index.from_vectorstore(vectorstore)
+    index.save(persist_path)
+    return index
+
+
+def update_sparse_index(vectorstore, persist_path, removed_ids=(), added_ids=()):
+    # Incremental ingest: touch only the changed chunks; full build if the store has no index yet
+    index = BM25Index.load(persist_path)
+    if index is None:
+        return build_sparse_index(vectorstore, persist_path)
+    added_texts = [vectorstore.docstore.search(doc_id).page_content for doc_id in added_ids]
+    index = index.updated(removed_ids=removed_ids, added_ids=added_ids, added_texts=added_texts)
+    index.save(persist_path)
+    return index
+
+
+def _dense_search(vectorstore, query: str, k: int) -> list:
+    # [(doc_id, distance)] best first, straight from the FAISS index
+    vector = np.asarray([vectorstore._embed_query(query)], dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        vector /= np.linalg.norm(vector, axis=1, keepdims=True)
+    distances, positions = vectorstore.index.search(vector, k)
+    return [
+        (vectorstore.index_to_docstore_id[p], float(d))
+        for p, d in zip(positions[0], distances[0]) if p != -1
+    ]
+
+
+def _min_max(values: dict) -> dict:
+    if not values:
+        return {}
+    lo, hi = min(values.values()), max(values.values())
+    if hi == lo:
+        return {key: 1.0 for key in values}
+    return {key: (v - lo) / (hi - lo) for key, v in values.items()}
+
+
+def fuse(dense: list, sparse: list, k: int, fusion: str = HYBRID_FUSION, alpha: float = HYBRID_ALPHA) -> list:
+    if fusion == "dense" or not sparse:
+        return [doc_id for doc_id, _ in dense[:k]]
+
+    scores = defaultdict(float)
+    if fusion == "linear":
+        # L2 distance: smaller is better, so negate before normalizing
+        dense_scores = _min_max({doc_id: -distance for doc_id, distance in dense})
+        sparse_scores = _min_max(dict(sparse))
+        for doc_id, score in dense_scores.items():
+            scores[doc_id] += alpha * score
+        for doc_id, score in sparse_scores.items():
+            scores[doc_id] += (1 - alpha) * score
+    else:
+        for rank, (doc_id, _) in enumerate(dense):
+            scores[doc_id] += 1 / (RRF_K + rank + 1)
+        for rank, (doc_id, _) in enumerate(sparse):
+            scores[doc_id] += 1 / (RRF_K + rank + 1)
+
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def hybrid_search(vectorstore, sparse_index, query: str, k: int, fusion: str = HYBRID_FUSION, alpha: float = HYBRID_ALPHA) -> list:
+    candidates = max(k, HYBRID_CANDIDATES)
+    dense = _dense_search(vectorstore, query, candidates if sparse_index else k)
+    sparse = sparse_index.search(query, candidates) if sparse_index else []
+    doc_ids = fuse(dense, sparse, k, fusion=fusion, alpha=alpha)
+    return [vectorstore.docstore.search(doc_id) for doc_id in doc_ids]
+
+
+if __name__ == "__main__":
+    # Build sparse indexes for stores created before they existed
+    import sys
+    from langchain_community.vectorstores import FAISS
+    from splitter_vectorstore import get_embeddings
+
+    for store_path in sys.argv[1:]:
+        store = FAISS.load_local(store_path, embeddings=get_embeddings(), allow_dangerous_deserialization=True)
+        build_sparse_index(store, store_path)
+        print(f"✅ BM25 index built for {store_path}")
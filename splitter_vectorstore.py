@@ -1,20 +1,169 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
+from sparse_index import build_sparse_index, update_sparse_index
+from mmap_store import save_chunk_store
+from index_spec import (
+    DEFAULT_INDEX_SPEC, all_vectors, apply_index_spec, apply_search_params,
+    load_index_spec, make_index, parse_index_spec, save_index_spec,
+)
+import faiss
+import numpy as np
+import os
+import shutil
+import tiktoken
+
+_encoding = tiktoken.get_encoding("cl100k_base")
+
+_embeddings = {}
+
+def get_embeddings(batch_size=None):
+    # Loading the sentence-transformer is expensive; share one instance per process (and batch size)
+    if batch_size not in _embeddings:
+        encode_kwargs = {"batch_size": batch_size} if batch_size else {}
+        _embeddings[batch_size] = HuggingFaceEmbeddings(
+            model_name="sentence-transformers/all-MiniLM-L6-v2",
+            encode_kwargs=encode_kwargs
+        )
+    return _embeddings[batch_size]
 
 def split_documents(documents, chunk_size=500, chunk_overlap=100):
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap
     )
-    return splitter.split_documents(documents)
+    chunks = splitter.split_documents(documents)
+    # Chunks never change after ingestion, so count their tokens once here;
+    # context packing then only adds up integers
+    for chunk in chunks:
+        chunk.metadata["token_count"] = len(_encoding.encode(chunk.page_content))
+    return chunks
 
-def build_vectorstore(chunks, persist_path=None):
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+def _new_vectorstore(chunks, embeddings, index_spec):
     vectorstore = FAISS.from_documents(chunks, embeddings)
+    spec = parse_index_spec(index_spec)
+    if spec["type"] != "flat":
+        # from_documents always builds a flat index; retrain the requested type on the same vectors
+        vectorstore.index = make_index(spec, all_vectors(vectorstore.index))
+    return vectorstore
+
+def _save_local(vectorstore, persist_path):
+    # Write-then-rename: the published search generation hard-links index.faiss, and
+    # running workers mmap it, so the file must never be rewritten in place
+    tmp_path = os.path.join(persist_path, ".save.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    vectorstore.save_local(tmp_path)
+    for name in ("index.faiss", "index.pkl"):
+        os.replace(os.path.join(tmp_path, name), os.path.join(persist_path, name))
+    os.rmdir(tmp_path)
+
+def _save(vectorstore, persist_path, index_spec, added_ids=(), removed_ids=()):
+    _save_local(vectorstore, persist_path)
+    # Pickle-free copy of the docstore that the chat loaders open (index.pkl stays for updates)
+    save_chunk_store(vectorstore, persist_path)
+    save_index_spec(index_spec, persist_path)
+    if added_ids or removed_ids:
+        # Incremental change: patch BM25 with the changed chunks instead of re-tokenizing the subject
+        update_sparse_index(vectorstore, persist_path, removed_ids=removed_ids, added_ids=added_ids)
+    else:
+        build_sparse_index(vectorstore, persist_path)
+
+def build_vectorstore(chunks, persist_path=None, batch_size=None, index_spec=None):
+    index_spec = parse_index_spec(index_spec or DEFAULT_INDEX_SPEC)
+    vectorstore = _new_vectorstore(chunks, get_embeddings(batch_size), index_spec)
 
     if persist_path:
-        vectorstore.save_local(persist_path)
+        _save(vectorstore, persist_path, index_spec)
         print(f" Vector store saved at: {persist_path}")
 
     return vectorstore
+
+def _load_for_update(persist_path):
+    if not os.path.exists(os.path.join(persist_path, "index.faiss")):
+        return None
+    vectorstore = FAISS.load_local(persist_path, embeddings=get_embeddings(), allow_dangerous_deserialization=True)
+    return apply_index_spec(vectorstore, persist_path)
+
+def _document_ids(vectorstore, filename):
+    return [
+        doc_id for doc_id, doc in vectorstore.docstore._dict.items()
+        if os.path.basename(doc.metadata.get("source", "")) == filename
+    ]
+
+def _rebuild_without(vectorstore, ids, index_spec):
+    removed = set(ids)
+    kept = [
+        (position, doc_id)
+        for position, doc_id in sorted(vectorstore.index_to_docstore_id.items())
+        if doc_id not in removed
+    ]
+    vectors = all_vectors(vectorstore.index)
+    remaining = vectors[[position for position, _ in kept]] if kept else np.empty((0, vectorstore.index.d), dtype=np.float32)
+
+    if faiss.try_extract_index_ivf(vectorstore.index) is not None:
+        # Keep the trained coarse quantizer (and PQ codebooks); only the inverted lists are refilled
+        index = faiss.clone_index(vectorstore.index)
+        index.reset()
+        if len(remaining):
+            index.add(remaining)
+        apply_search_params(index, index_spec)
+    else:
+        index = make_index(index_spec, remaining)
+    vectorstore.index = index
+    vectorstore.index_to_docstore_id = {i: doc_id for i, (_, doc_id) in enumerate(kept)}
+    vectorstore.docstore.delete(ids)
+
+def _remove_ids(vectorstore, ids, index_spec):
+    if isinstance(vectorstore.index, faiss.IndexFlat):
+        vectorstore.delete(ids)
+    else:
+        # HNSW has no remove_ids, and IVF's keeps the old ids while LangChain renumbers
+        # index_to_docstore_id to 0..n-1; rebuild from the remaining vectors instead
+        _rebuild_without(vectorstore, ids, index_spec)
+
+def add_documents_to_vectorstore(chunks, persist_path):
+    # Embeds only the new chunks and appends them to the persisted index
+    return replace_document_in_vectorstore(chunks, persist_path)
+
+def replace_document_in_vectorstore(chunks, persist_path, filename=None):
+    # Drops `filename`'s old chunks (if given) and appends `chunks` on one loaded store,
+    # so a re-upload costs a single load and a single save
+    vectorstore = _load_for_update(persist_path)
+    removed_ids = []
+    added_ids = ()
+    if vectorstore is None:
+        if not chunks:
+            return None
+        index_spec = parse_index_spec(DEFAULT_INDEX_SPEC)
+        vectorstore = _new_vectorstore(chunks, get_embeddings(), index_spec)
+    else:
+        index_spec = load_index_spec(persist_path)
+        if filename:
+            removed_ids = _document_ids(vectorstore, filename)
+            if removed_ids:
+                _remove_ids(vectorstore, removed_ids, index_spec)
+        if chunks:
+            # Trained indexes (IVF/HNSW) accept new vectors without retraining
+            added_ids = vectorstore.add_documents(chunks)
+        if not removed_ids and not added_ids:
+            return vectorstore
+
+    _save(vectorstore, persist_path, index_spec, added_ids=added_ids, removed_ids=removed_ids)
+    if removed_ids:
+        print(f" Removed {len(removed_ids)} chunks of {filename} from vector store at: {persist_path}")
+    print(f" Added {len(chunks)} chunks to vector store at: {persist_path}")
+    return vectorstore
+
+def remove_document_from_vectorstore(persist_path, filename):
+    # Drops every chunk whose source file is `filename`; returns how many were removed
+    vectorstore = _load_for_update(persist_path)
+    if vectorstore is None:
+        return 0
+
+    ids = _document_ids(vectorstore, filename)
+    if ids:
+        index_spec = load_index_spec(persist_path)
+        _remove_ids(vectorstore, ids, index_spec)
+        _save(vectorstore, persist_path, index_spec, removed_ids=ids)
+        print(f" Removed {len(ids)} chunks of {filename} from vector store at: {persist_path}")
+    return len(ids)
@@ -0,0 +1,13 @@
+from answer_cache import SemanticAnswerCache
+
+KEY = ("ECE", "1", "2")
+BRIEF = (True, (600, 300))
+DETAILED = (False, (1000, 600))
+
+
+def test_lookup_matches_only_the_same_variant():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(KEY, "v1", [1.0, 0.0], BRIEF, "Briefly, what is KVL?", "short answer", [])
+
+    assert cache.lookup(KEY, "v1", [1.0, 0.01], DETAILED) is None
+    assert cache.lookup(KEY, "v1", [1.0, 0.01], BRIEF)["answer"] == "short answer"
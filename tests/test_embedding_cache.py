@@ -0,0 +1,19 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from embedding_cache import CachedEmbeddings
+
+
+def test_spill_survives_restart_and_stays_bounded(tmp_path):
+    path = str(tmp_path / "query_embeddings.sqlite")
+    cache = CachedEmbeddings(DeterministicFakeEmbedding(size=8), spill_path=path)
+    cache._spill.batch = 4
+    cache._spill.max_rows = 10
+    vectors = {f"question {i}": cache.embed_query(f"Question {i}") for i in range(30)}
+    cache._spill.flush()
+
+    restarted = CachedEmbeddings(DeterministicFakeEmbedding(size=8), spill_path=path)
+    rows = restarted._spill._conn().execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+    assert rows <= 10
+    # The most recent writes are the ones kept
+    assert restarted.embed_query("question 29") == pytest.approx(vectors["question 29"], rel=1e-6)
+    assert restarted.stats()["disk_hits"] == 1
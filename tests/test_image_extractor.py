@@ -0,0 +1,39 @@
+import fitz
+from image_extractor import page_content_hash
+
+
+def _form_page_pdf(path, text):
+    # A page whose content stream is only "/fzFrm0 Do"; the text lives in the form XObject
+    source = fitz.open()
+    source.new_page().insert_text((72, 72), text)
+    pdf = fitz.open()
+    page = pdf.new_page()
+    page.show_pdf_page(page.rect, source, 0)
+    pdf.save(path)
+    return fitz.open(path)
+
+
+def _hash(doc, page_num=0):
+    return page_content_hash(doc, doc[page_num])
+
+
+def test_form_xobject_pages_hash_by_their_content(tmp_path):
+    alpha = _form_page_pdf(str(tmp_path / "alpha.pdf"), "alpha")
+    beta = _form_page_pdf(str(tmp_path / "beta.pdf"), "beta")
+    assert alpha[0].read_contents() == beta[0].read_contents()
+
+    assert _hash(alpha) != _hash(beta)
+    assert _hash(alpha) == _hash(fitz.open(str(tmp_path / "alpha.pdf")))
+
+
+def test_link_targets_do_not_change_the_hash(tmp_path):
+    hashes = []
+    for i, other in enumerate(["first", "second"]):
+        pdf = fitz.open()
+        pdf.new_page().insert_text((72, 72), "contents")
+        pdf.new_page().insert_text((72, 72), other)
+        pdf[0].insert_link({"kind": fitz.LINK_GOTO, "page": 1, "from": fitz.Rect(72, 60, 200, 80)})
+        path = str(tmp_path / f"linked{i}.pdf")
+        pdf.save(path)
+        hashes.append(_hash(fitz.open(path)))
+    assert hashes[0] == hashes[1]
@@ -0,0 +1,34 @@
+import random
+from memory_handler import (
+    _encoding, _missing_counts, _to_entries, _turn_messages, _with_counts, history_to_str, trim_history,
+)
+
+WORDS = ["ohm", "8085", "KVL.", "ω", "µF", "!", "?", ":", "-", "  ", "\n", "\n\n", "résumé", "🙂", "x=1;", "'s"]
+
+
+def _text(rng):
+    return "".join(rng.choice(WORDS) + rng.choice(["", " "]) for _ in range(rng.randint(0, 12)))
+
+
+def _longest_fitting_suffix(entries, max_tokens):
+    for start in range(len(entries) + 1):
+        if start == len(entries) or len(_encoding.encode(history_to_str(entries[start:]))) <= max_tokens:
+            return entries[start:]
+
+
+def test_trim_history_matches_joined_token_count():
+    rng = random.Random(0)
+    for _ in range(300):
+        stored = []
+        for _ in range(rng.randint(0, 5)):
+            stored += _turn_messages(_text(rng), _text(rng))
+        entries = _to_entries(stored)
+        max_tokens = rng.randint(0, 60)
+        assert trim_history(entries, max_tokens) == _longest_fitting_suffix(entries, max_tokens)
+
+
+def test_legacy_messages_are_counted_once():
+    stored = _turn_messages("What is KVL?", "Kirchhoff's voltage law.")
+    legacy = [{key: value for key, value in message.items() if not key.endswith("token_count")} for message in stored]
+    assert _missing_counts(legacy)
+    assert _with_counts(legacy) == stored
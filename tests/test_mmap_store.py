@@ -0,0 +1,34 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import splitter_vectorstore
+from mmap_store import load_search_vectorstore
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=32)
+
+
+def _chunks(source, count):
+    return [
+        Document(page_content=f"{source} chunk {i}", metadata={"source": f"docs/{source}", "token_count": 3})
+        for i in range(count)
+    ]
+
+
+def test_loaded_store_survives_republish(tmp_path, monkeypatch):
+    monkeypatch.setattr(splitter_vectorstore, "get_embeddings", lambda batch_size=None: EMBEDDINGS)
+    path = str(tmp_path / "subject")
+    first = _chunks("a.pdf", 200)
+    second = _chunks("b.pdf", 200)
+    splitter_vectorstore.build_vectorstore(first + second, persist_path=path, index_spec="ivf:nlist=4,nprobe=4")
+    old = load_search_vectorstore(path, EMBEDDINGS, allow_pickle=False)
+
+    splitter_vectorstore.remove_document_from_vectorstore(path, "a.pdf")
+    splitter_vectorstore.add_documents_to_vectorstore(_chunks("c.pdf", 50), path)
+
+    # The mmapped index and its chunks still belong to the generation the worker loaded
+    for chunk in first[::25]:
+        assert old.similarity_search(chunk.page_content, k=1)[0].page_content == chunk.page_content
+
+    new = load_search_vectorstore(path, EMBEDDINGS, allow_pickle=False)
+    assert new.index.ntotal == len(second) + 50
+    for chunk in second[::25]:
+        assert new.similarity_search(chunk.page_content, k=1)[0].page_content == chunk.page_content
@@ -0,0 +1,25 @@
+import time
+from rerank_service import RerankService, _Request
+
+
+class _Model:
+    def predict(self, pairs, batch_size=None):
+        return [float(len(passage)) for _, passage in pairs]
+
+
+def test_collect_drains_backlog_after_deadline():
+    service = RerankService(_Model(), max_wait_ms=5, max_batch_pairs=10)
+    # Queued directly, without starting the batcher thread
+    for i in range(6):
+        service._queue.put(_Request([("q", "p" * i), ("q", "p")]))
+    # The batcher was busy: every queued request is already past its deadline
+    time.sleep(0.02)
+
+    batch = service._collect()
+    assert [len(r.pairs) for r in batch] == [2] * 5
+    assert service._queue.qsize() == 1
+
+
+def test_predict_splits_scores_per_caller():
+    service = RerankService(_Model(), max_wait_ms=5)
+    assert service.predict([("q", "abc"), ("q", "a")]) == [3.0, 1.0]
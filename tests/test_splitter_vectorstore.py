@@ -0,0 +1,66 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import splitter_vectorstore
+from index_spec import all_vectors
+from mmap_store import load_search_vectorstore
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=32)
+
+
+def _chunks(source, count):
+    return [
+        Document(page_content=f"{source} chunk {i}", metadata={"source": f"docs/{source}", "token_count": 3})
+        for i in range(count)
+    ]
+
+
+def _assert_hits_match_docstore(vectorstore, chunks):
+    assert vectorstore.index.ntotal == len(vectorstore.index_to_docstore_id)
+    for chunk in chunks:
+        hit = vectorstore.similarity_search(chunk.page_content, k=1)[0]
+        assert hit.page_content == chunk.page_content
+
+
+@pytest.mark.parametrize("index_spec", ["ivf:nlist=4,nprobe=4", "hnsw"])
+def test_remove_keeps_ids_aligned(tmp_path, monkeypatch, index_spec):
+    monkeypatch.setattr(splitter_vectorstore, "get_embeddings", lambda batch_size=None: EMBEDDINGS)
+    path = str(tmp_path / "subject")
+    removed = _chunks("a.pdf", 3)
+    kept = _chunks("b.pdf", 397)
+    splitter_vectorstore.build_vectorstore(removed + kept, persist_path=path, index_spec=index_spec)
+
+    assert splitter_vectorstore.remove_document_from_vectorstore(path, "a.pdf") == 3
+
+    vectorstore = splitter_vectorstore._load_for_update(path)
+    assert len(all_vectors(vectorstore.index)) == len(kept)
+    _assert_hits_match_docstore(vectorstore, kept[::20])
+
+    # Later additions get fresh positions instead of colliding with old ids
+    added = _chunks("c.pdf", 5)
+    vectorstore = splitter_vectorstore.add_documents_to_vectorstore(added, path)
+    _assert_hits_match_docstore(vectorstore, kept[::40] + added)
+    _assert_hits_match_docstore(load_search_vectorstore(path, EMBEDDINGS, allow_pickle=False), kept[::40] + added)
+
+
+@pytest.mark.parametrize("index_spec", ["flat", "ivf:nlist=4,nprobe=4", "hnsw"])
+def test_replace_document_saves_once(tmp_path, monkeypatch, index_spec):
+    monkeypatch.setattr(splitter_vectorstore, "get_embeddings", lambda batch_size=None: EMBEDDINGS)
+    path = str(tmp_path / "subject")
+    kept = _chunks("b.pdf", 397)
+    splitter_vectorstore.build_vectorstore(_chunks("a.pdf", 3) + kept, persist_path=path, index_spec=index_spec)
+
+    saves = []
+    save = splitter_vectorstore._save
+    monkeypatch.setattr(splitter_vectorstore, "_save", lambda *args, **kwargs: saves.append(kwargs) or save(*args, **kwargs))
+    replaced = [
+        Document(page_content=f"a.pdf revised chunk {i}", metadata={"source": "docs/a.pdf", "token_count": 4})
+        for i in range(4)
+    ]
+    splitter_vectorstore.replace_document_in_vectorstore(replaced, path, "a.pdf")
+
+    assert len(saves) == 1
+    assert len(saves[0]["removed_ids"]) == 3 and len(saves[0]["added_ids"]) == 4
+    vectorstore = load_search_vectorstore(path, EMBEDDINGS, allow_pickle=False)
+    assert vectorstore.index.ntotal == len(kept) + len(replaced)
+    _assert_hits_match_docstore(vectorstore, kept[::40] + replaced)
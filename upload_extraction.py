@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from threading import Lock
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+import uuid
+from database import db
+from multimodal import extract_upload_text
+
+load_dotenv()
+
+# Uploads up to this size are extracted inside the request; larger ones become background jobs
+MULTIMODAL_SYNC_MAX_BYTES = int(os.getenv("MULTIMODAL_SYNC_MAX_BYTES", str(2 * 1024 * 1024)))
+MULTIMODAL_WORKERS = int(os.getenv("MULTIMODAL_WORKERS", "2"))
+MULTIMODAL_JOB_TTL = int(os.getenv("MULTIMODAL_JOB_TTL", str(60 * 60)))
+EXTRACTION_CACHE_TTL = int(os.getenv("EXTRACTION_CACHE_TTL", str(30 * 24 * 60 * 60)))
+
+SUPPORTED_UPLOADS = {"pdf", "png", "jpg", "jpeg"}
+
+# Extracted text per upload, keyed by the SHA-256 of the file bytes
+extractions_collection = db["upload_extractions"]
+
+_pool = None
+_pool_lock = Lock()
+
+
+def _extraction_pool() -> ProcessPoolExecutor:
+    # Created on first use; spawn so workers import only multimodal, not the app's clients
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MULTIMODAL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def content_hash(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+async def ensure_extraction_indexes():
+    await extractions_collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=EXTRACTION_CACHE_TTL)
+
+
+async def get_cached_text(digest: str):
+    doc = await extractions_collection.find_one({"_id": digest}, {"text": 1})
+    return doc["text"] if doc else None
+
+
+class ExtractionJobs:
+    """Runs upload extraction off the request, one task per distinct file content.
+
+    Concurrent uploads of the same bytes share a task; finished text is written to
+    ``upload_extractions`` so later uploads skip OCR. Jobs are kept in memory for polling
+    until ``job_ttl`` after they finish. The registry is per process: with several uvicorn
+    workers, a poll that lands on another worker gets 404, so run the app with one worker
+    (or sticky routing) while background jobs are enabled.
+    """
+
+    def __init__(self, job_ttl: int = MULTIMODAL_JOB_TTL):
+        self.job_ttl = job_ttl
+        self._tasks = {}  # content hash -> asyncio.Task producing the text
+        self._jobs = {}  # job_id -> job dict
+        self.cache_hits = 0
+        self.extractions = 0
+        self.failures = 0
+
+    def _task(self, digest: str, file_ext: str, contents: bytes) -> asyncio.Task:
+        task = self._tasks.get(digest)
+        if task is None:
+            task = asyncio.create_task(self._extract(digest, file_ext, contents))
+            self._tasks[digest] = task
+            task.add_done_callback(lambda _: self._tasks.pop(digest, None))
+        return task
+
+    async def _extract(self, digest: str, file_ext: str, contents: bytes) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            text = await loop.run_in_executor(_extraction_pool(), extract_upload_text, file_ext, contents)
+        except Exception:
+            self.failures += 1
+            raise
+        self.extractions += 1
+        await extractions_collection.update_one(
+            {"_id": digest},
+            {"$set": {"text": text, "file_ext": file_ext, "created_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        return text
+
+    async def cached_text(self, contents: bytes):
+        """Previously extracted text for these bytes, or None."""
+        text = await get_cached_text(content_hash(contents))
+        if text is not None:
+            self.cache_hits += 1
+        return text
+
+    async def extract(self, file_ext: str, contents: bytes) -> str:
+        """Extracts in the pool and waits; call after a cached_text miss."""
+        digest = content_hash(contents)
+        # shield: a client disconnecting must not cancel work other uploads may be sharing
+        return await asyncio.shield(self._task(digest, file_ext, contents))
+
+    def _prune(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and now - job["finished_at"] > self.job_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def start(self, username: str, filename: str, file_ext: str, contents: bytes) -> dict:
+        self._prune()
+        digest = content_hash(contents)
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "username": username,
+            "filename": filename,
+            "content_hash": digest,
+            "status": "running",
+            "text": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+        self._jobs[job["job_id"]] = job
+
+        async def _run():
+            try:
+                text = await get_cached_text(digest)
+                if text is None:
+                    text = await self._task(digest, file_ext, contents)
+                else:
+                    self.cache_hits += 1
+                job.update(status="done", text=text)
+            except Exception as e:
+                job.update(status="failed", error=str(e))
+                print(f"❌ Extraction job {job['job_id']} failed for {filename}: {e}")
+            finally:
+                job["finished_at"] = time.time()
+
+        job["task"] = asyncio.create_task(_run())
+        return job
+
+    def get(self, job_id: str, username: str):
+        self._prune()
+        job = self._jobs.get(job_id)
+        # Jobs are private to the uploader
+        if job is None or job["username"] != username:
+            return None
+        return job
+
+    @staticmethod
+    def public(job: dict) -> dict:
+        return {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "filename": job["filename"],
+            "error": job["error"],
+        }
+
+    def stats(self) -> dict:
+        statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            "jobs_running": statuses.count("running"),
+            "jobs_done": statuses.count("done"),
+            "jobs_failed": statuses.count("failed"),
+            "extractions_in_flight": len(self._tasks),
+            "extractions": self.extractions,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+        }
+
+
+extraction_jobs = ExtractionJobs()
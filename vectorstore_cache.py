@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+import hashlib
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+VECTORSTORE_CACHE_MB = int(os.getenv("VECTORSTORE_CACHE_MB", "2048"))
+
+
+def _file_signature(path: Path) -> tuple:
+    # (name, mtime, size) of every file in the store directory; any rewrite changes it
+    entries = []
+    for child in sorted(path.iterdir()):
+        if child.is_file():
+            stat = child.stat()
+            entries.append((child.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+
+def _estimate_bytes(signature: tuple) -> int:
+    # On-disk size of index + docstore is a close proxy for the loaded footprint;
+    # pickle-free stores (search.current) never load index.pkl and read chunks lazily
+    names = {name for name, _, _ in signature}
+    skipped = {"index.pkl"} if "search.current" in names else set()
+    return sum(size for name, _, size in signature if name not in skipped)
+
+
+class VectorstoreCache:
+    """Process-wide LRU of loaded vectorstores, bounded by an estimated memory budget."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (signature, size, value)
+        self._lock = Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _key_lock(self, key) -> Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, Lock())
+
+    def get(self, key, path, loader):
+        path = Path(path)
+        signature = _file_signature(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+
+        # Serialize loads per key so a burst of requests only unpickles once
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                if entry is not None:
+                    self.invalidations += 1
+                self.misses += 1
+
+            value = loader(path)
+            size = _estimate_bytes(signature)
+
+            with self._lock:
+                self._entries[key] = (signature, size, value)
+                self._entries.move_to_end(key)
+                self._evict()
+            return value
+
+    def version(self, path) -> str:
+        path = Path(path)
+        if not path.exists():
+            return ""
+        return hashlib.sha1(repr(_file_signature(path)).encode()).hexdigest()[:16]
+
+    def _evict(self):
+        total = sum(size for _, size, _ in self._entries.values())
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            total -= size
+            self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(size for _, size, _ in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+vectorstore_cache = VectorstoreCache(max_bytes=VECTORSTORE_CACHE_MB * 1024 * 1024)